@@ -1,7 +1,36 @@
+import ast
+import functools
 import math
 import asteval
 import re
 
+# Upper bound on expressions with cached names and bytecode before the caches are reset
+PARSE_CACHE_SIZE = 4096
+# Number of (expression, input values) results kept by the LRU value memo
+VALUE_CACHE_SIZE = 8192
+
+_MISSING = object() # Placeholder for undefined names in value-memo keys
+
+def _memo_key_part(value):
+    """
+    Value-memo key for one input. Equal values of different types (3 and 3.0)
+    or signs of zero (0.0 and -0.0) can give different results, so both are
+    part of the key.
+    """
+    if isinstance(value, float) and value == 0:
+        return (type(value), value, math.copysign(1.0, value))
+    return (type(value), value, None)
+
+# Math functions exposed to expressions (also the only callables the compiled fast path allows)
+SAFE_MATH_FUNCTIONS = ['sin', 'cos', 'tan', 'asin', 'acos', 'atan', 'atan2',
+                       'sqrt', 'exp', 'log', 'log10', 'pow', 'abs']
+
+# AST nodes an expression may contain to be compiled to CPython bytecode. Anything
+# else (attributes, subscripts, comparisons, '**', ...) stays on asteval.
+_NUMERIC_NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Constant, ast.Name, ast.Load, ast.Call,
+                  ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.USub, ast.UAdd)
+_COMPILED_GLOBALS = {'__builtins__': {}}
+
 def create_configured_asteval():
     """
     Factory function to create and configure a new asteval.Interpreter instance.
@@ -10,8 +39,7 @@ def create_configured_asteval():
     aeval = asteval.Interpreter(symtable={}, minimal=True, no_if=True, no_for=True, no_while=True, no_try=True)
 
     # Add safe math functions
-    for func_name in ['sin', 'cos', 'tan', 'asin', 'acos', 'atan', 'atan2',
-                      'sqrt', 'exp', 'log', 'log10', 'pow', 'abs']:
+    for func_name in SAFE_MATH_FUNCTIONS:
         if hasattr(math, func_name):
             aeval.symtable[func_name] = getattr(math, func_name)
     
@@ -34,6 +62,14 @@ class ExpressionEvaluator:
     """A centralized, stateful expression evaluator using asteval."""
     def __init__(self):
         self.interpreter = create_configured_asteval()
+        # Keyed by expression text; they do not depend on the symbol table, so
+        # they survive clear_symbols() and interpreter resets.
+        self._names_cache = {} # Identifiers referenced by each cached expression
+        self._code_cache = {}  # Bytecode for plain arithmetic expressions (None if not eligible)
+        self._recorded_names = None
+        # Results keyed by (expression, values of the names it reads); safe across
+        # symbol table changes because the inputs are part of the key
+        self._memoized_run = functools.lru_cache(maxsize=VALUE_CACHE_SIZE)(self._run)
 
     def clear_symbols(self):
         """Resets the symbol table to its initial state."""
@@ -45,8 +81,109 @@ class ExpressionEvaluator:
 
     def get_symbol(self, name, default_val):
         """Gets a symbol from the symbol table, returning default_val if it does not exist"""
+        if self._recorded_names is not None:
+            self._recorded_names.add(name)
         return self.interpreter.symtable.get(name,default_val)
+
+    def start_recording_names(self):
+        """Starts collecting every identifier that evaluations read."""
+        self._recorded_names = set()
+
+    def stop_recording_names(self):
+        """Stops recording and returns the set of identifiers read since start_recording_names()."""
+        names, self._recorded_names = self._recorded_names, None
+        return names if names is not None else set()
     
+    def _parse(self, expression):
+        """
+        Caches the identifiers an expression reads and, for plain arithmetic, its
+        bytecode. Returns the identifiers, or None if the expression does not parse.
+        """
+        names = self._names_cache.get(expression)
+        if names is None:
+            try:
+                tree = ast.parse(expression)
+            except (SyntaxError, ValueError):
+                return None
+            if len(self._names_cache) >= PARSE_CACHE_SIZE:
+                self._names_cache.clear()
+                self._code_cache.clear()
+            names = self._names_cache[expression] = frozenset(
+                n.id for n in ast.walk(tree) if isinstance(n, ast.Name))
+            self._code_cache[expression] = self._compile_numeric(expression)
+        return names
+
+    @staticmethod
+    def _compile_numeric(expression):
+        """
+        Compiles an expression to bytecode if it is plain arithmetic on names,
+        numbers and the whitelisted math functions; returns None otherwise.
+        """
+        try:
+            tree = ast.parse(expression, mode='eval')
+        except SyntaxError:
+            return None
+        for node in ast.walk(tree):
+            if not isinstance(node, _NUMERIC_NODES):
+                return None
+            if isinstance(node, ast.Constant) and type(node.value) not in (int, float):
+                return None
+            if isinstance(node, ast.Name) and node.id.startswith('_'):
+                return None
+            if isinstance(node, ast.Call) and (node.keywords or not isinstance(node.func, ast.Name)
+                                               or node.func.id not in SAFE_MATH_FUNCTIONS):
+                return None
+        return compile(tree, '<expression>', 'eval')
+
+    def _eval(self, expression):
+        """
+        Evaluates an expression, reusing the memoized result when the values of
+        every name it reads are unchanged. Raises on error.
+        """
+        names = self._names_cache.get(expression)
+        if names is None:
+            return self._run(expression) # First sight: parse and evaluate
+
+        if self._recorded_names is not None:
+            self._recorded_names.update(names)
+        symtable = self.interpreter.symtable
+        key = []
+        for name in names:
+            value = symtable.get(name, _MISSING)
+            if value is _MISSING:
+                return self._interpret(expression) # Undefined name: let asteval report it directly
+            key.append(_memo_key_part(value))
+        key = tuple(key)
+        try:
+            hash(key)
+        except TypeError:
+            return self._run(expression) # Reads a dict/list symbol (position, rotation, ...)
+        return self._memoized_run(expression, key)
+
+    def _run(self, expression, key=None):
+        """
+        Evaluates an expression, raising on error. Plain arithmetic runs as compiled
+        bytecode; everything else goes through _interpret. The key argument only
+        distinguishes entries in the value memo.
+        """
+        interpreter = self.interpreter
+        code = self._code_cache.get(expression)
+        if code is not None:
+            if self._recorded_names is not None:
+                self._recorded_names.update(self._names_cache[expression])
+            try:
+                return eval(code, _COMPILED_GLOBALS, interpreter.symtable)
+            except Exception:
+                pass # Re-run through asteval below for its usual error report
+        return self._interpret(expression)
+
+    def _interpret(self, expression):
+        """Evaluates an expression with asteval, raising on error."""
+        names = self._parse(expression)
+        if names is not None and self._recorded_names is not None:
+            self._recorded_names.update(names)
+        return self.interpreter.eval(expression, show_errors=False, raise_errors=True)
+
     def _preprocess_gdml_indexing(self, expression):
         """
         Converts GDML-style array indexing like 'm[i,j]' into 'm_i_j'.
@@ -70,7 +207,7 @@ class ExpressionEvaluator:
                 evaluated_indices = []
                 for index_expr in indices:
                     # Evaluate the index using the current state of the interpreter
-                    value = self.interpreter.eval(index_expr.strip())
+                    value = self._eval(index_expr.strip())
                     # GDML is 1-based, our flattened names are 0-based.
                     evaluated_indices.append(str(int(value) - 1))
                 
@@ -97,7 +234,7 @@ class ExpressionEvaluator:
             processed_expression = self._preprocess_gdml_indexing(expression)
             
             # Then, evaluate the final processed string
-            result = self.interpreter.eval(processed_expression, show_errors=False, raise_errors=True)
+            result = self._eval(processed_expression)
             return True, result
         except Exception as e:
             if verbose:
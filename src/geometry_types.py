@@ -46,16 +46,14 @@ def convert_from_internal_units(value, target_unit_str, category="length"):
 
 def get_unit_value(unit_str, category="length"):
     # Geant4 internal units are mm, rad
-    factors = {
-        "length": {"mm": 1.0, "cm": 10.0, "m": 1000.0},
-        "angle": {"rad": 1.0, "deg": math.pi / 180.0}
-    }
-    if unit_str and category in factors and unit_str in factors[category]:
-        return factors[category][unit_str]
+    if unit_str:
+        return UNIT_FACTORS.get(category, {}).get(unit_str, 1.0)
     return 1.0 # Default multiplier
 
 class Define:
     """Represents a defined entity like position, rotation, or constant."""
+    __slots__ = ('id', 'name', 'type', 'raw_expression', 'unit', 'category', 'value')
+
     def __init__(self, name, type, raw_expression, unit=None, category=None):
         self.id = str(uuid.uuid4())
         self.name = name
@@ -136,6 +134,9 @@ class Isotope:
 
 class Material:
     """Represents a material."""
+    __slots__ = ('id', 'name', 'mat_type', 'Z_expr', 'A_expr', 'density_expr',
+                 '_evaluated_Z', '_evaluated_A', '_evaluated_density', 'state', 'components')
+
     def __init__(self, name, mat_type='standard', Z_expr=None, A_expr=None, density_expr="0.0", state=None, components=None):
         self.id = str(uuid.uuid4())
         self.name = name
@@ -200,6 +201,8 @@ class Material:
 
 class Solid:
     """Base class for solids. Parameters should be in internal units (e.g., mm)."""
+    __slots__ = ('id', 'name', 'type', 'raw_parameters', '_evaluated_parameters')
+
     def __init__(self, name, solid_type, raw_parameters):
         self.id = str(uuid.uuid4())
         self.name = name
@@ -227,6 +230,9 @@ class Solid:
 
 class LogicalVolume:
     """Represents a logical volume."""
+    __slots__ = ('id', 'name', 'solid_ref', 'material_ref', 'vis_attributes', 'is_sensitive',
+                 'content_type', 'content')
+
     def __init__(self, name, solid_ref, material_ref, vis_attributes=None, is_sensitive=False):
         self.id = str(uuid.uuid4())
         self.name = name
@@ -304,6 +310,10 @@ class LogicalVolume:
 
 class PhysicalVolumePlacement:
     """Represents a physical volume placement (physvol)."""
+    __slots__ = ('id', 'name', 'volume_ref', 'parent_lv_name', 'copy_number_expr', 'copy_number',
+                 'position', 'rotation', 'scale',
+                 '_evaluated_position', '_evaluated_rotation', '_evaluated_scale', '_matrix_cache')
+
     def __init__(self, name, volume_ref, parent_lv_name = None, copy_number_expr="0",
                  position_val_or_ref=None, rotation_val_or_ref=None, scale_val_or_ref=None):
         self.id = str(uuid.uuid4())
@@ -323,6 +333,8 @@ class PhysicalVolumePlacement:
         self._evaluated_position = {'x': 0, 'y': 0, 'z': 0}
         self._evaluated_rotation = {'x': 0, 'y': 0, 'z': 0}
         self._evaluated_scale = {'x': 1, 'y': 1, 'z': 1}
+        # (position, rotation, scale, matrix) from the last get_transform_matrix() call
+        self._matrix_cache = None
 
     # Function to clone the PV for Assembly placements
     def clone(self):
@@ -350,11 +362,21 @@ class PhysicalVolumePlacement:
         """
         Returns a 4x4 numpy transformation matrix for this placement,
         applying scale, then rotation, then translation.
+        The matrix is read-only and reused until an evaluated transform is reassigned.
         """
-        pos = self._evaluated_position
-        rot = self._evaluated_rotation
-        scl = self._evaluated_scale
+        pos, rot, scl = self._evaluated_position, self._evaluated_rotation, self._evaluated_scale
+        cache = self._matrix_cache
+        # Evaluated dicts are replaced, never edited in place, on recalculation
+        if cache is not None and cache[0] is pos and cache[1] is rot and cache[2] is scl:
+            return cache[3]
+        matrix = PhysicalVolumePlacement.compose_transform_matrix(pos, rot, scl)
+        matrix.setflags(write=False)
+        self._matrix_cache = (pos, rot, scl, matrix)
+        return matrix
 
+    @staticmethod
+    def compose_transform_matrix(pos, rot, scl):
+        """Builds the 4x4 matrix T * R * S from evaluated position, rotation (rad) and scale dicts."""
         # Create Translation Matrix (T)
         T = np.array([[1, 0, 0, pos['x']],
                       [0, 1, 0, pos['y']],
@@ -450,6 +472,8 @@ class PhysicalVolumePlacement:
 
 class Assembly:
     """Represents a collection of placed logical volumes."""
+    __slots__ = ('id', 'name', 'placements')
+
     def __init__(self, name):
         self.id = str(uuid.uuid4())
         self.name = name
@@ -474,6 +498,9 @@ class Assembly:
 
 class DivisionVolume:
     """Represents a <divisionvol> placement."""
+    __slots__ = ('id', 'name', 'type', 'volume_ref', 'axis', 'number', 'width', 'offset', 'unit',
+                 '_evaluated_number', '_evaluated_width', '_evaluated_offset')
+
     def __init__(self, name, volume_ref, axis, number=0, width=0.0, offset=0.0, unit="mm"):
         self.id = str(uuid.uuid4())
         self.name = name  # Not in GDML spec, but useful for our UI
@@ -506,6 +533,11 @@ class DivisionVolume:
 
 class ReplicaVolume:
     """Represents a <replicavol> placement."""
+    __slots__ = ('id', 'name', 'type', 'volume_ref', 'direction', 'number', 'width', 'offset',
+                 'start_position', 'start_rotation',
+                 '_evaluated_number', '_evaluated_width', '_evaluated_offset',
+                 '_evaluated_start_position', '_evaluated_start_rotation')
+
     def __init__(self, name, volume_ref, number, direction, width=0.0, offset=0.0, start_position=None, start_rotation=None):
         self.id = str(uuid.uuid4())
         self.name = name
@@ -556,6 +588,9 @@ class ReplicaVolume:
 
 class Parameterisation:
     """Represents a single <parameters> block for a parameterised volume."""
+    __slots__ = ('number', 'position', 'rotation', 'dimensions_type', 'dimensions',
+                 '_evaluated_position', '_evaluated_rotation', '_evaluated_dimensions')
+
     def __init__(self, number, position, dimensions_type, dimensions, rotation=None):
         self.number = number
         self.position = position
@@ -589,6 +624,8 @@ class Parameterisation:
 
 class ParamVolume:
     """Represents a <paramvol> placement."""
+    __slots__ = ('id', 'name', 'type', 'volume_ref', 'ncopies', 'parameters', '_evaluated_ncopies')
+
     def __init__(self, name, volume_ref, ncopies):
         self.id = str(uuid.uuid4())
         self.name = name
@@ -784,7 +821,8 @@ class GeometryState:
         self.active_source_ids = [] 
 
         # --- Dictionary to hold UI grouping information ---
-        # Format: { 'solids': [{'name': 'MyCrystals', 'members': ['solid1_name', 'solid2_name']}], ... }
+        # Format: { 'solids': [{'name': 'MyCrystals', 'members': {'solid1_name': True, 'solid2_name': True}}], ... }
+        # 'members' is an insertion-ordered dict used as an ordered set; to_dict() writes it out as a list.
         self.ui_groups = {
             'define': [],
             'material': [],
@@ -835,7 +873,8 @@ class GeometryState:
             "border_surfaces": {k: v.to_dict() for k, v in self.border_surfaces.items()},
             "sources": {k: v.to_dict() for k, v in self.sources.items()},
             "active_source_ids": self.active_source_ids,
-            "ui_groups": self.ui_groups
+            "ui_groups": {group_type: [{**group, 'members': list(group['members'])} for group in groups]
+                          for group_type, groups in self.ui_groups.items()}
         }
 
     @classmethod
@@ -873,7 +912,10 @@ class GeometryState:
         else:
             instance.active_source_ids = []
 
-        instance.ui_groups = data.get('ui_groups', instance.ui_groups)
+        ui_groups = data.get('ui_groups')
+        if ui_groups is not None:
+            instance.ui_groups = {group_type: [{**group, 'members': dict.fromkeys(group.get('members', ()), True)} for group in groups]
+                                  for group_type, groups in ui_groups.items()}
 
         return instance
         
@@ -1054,21 +1096,19 @@ class GeometryState:
             float(replica.direction['z'])
         ])
         
-        start_pv = PhysicalVolumePlacement("temp_start", "temp_lv")
-        start_pv._evaluated_position = replica._evaluated_start_position
-        start_pv._evaluated_rotation = replica._evaluated_start_rotation
-        start_transform_matrix = start_pv.get_transform_matrix()
+        start_transform_matrix = PhysicalVolumePlacement.compose_transform_matrix(
+            replica._evaluated_start_position, replica._evaluated_start_rotation, {'x': 1, 'y': 1, 'z': 1})
 
-        for i in range(number):
-            translation_dist = -width * (number - 1) * 0.5 + i * width + offset
-            
-            algo_pos = axis_vec * translation_dist
-            algo_matrix = np.identity(4)
-            algo_matrix[0:3, 3] = algo_pos
-            
-            final_local_matrix = start_transform_matrix @ algo_matrix
+        # Each copy is only translated along the axis in the start frame, so all copies share
+        # the start rotation and their positions can be computed for every copy at once
+        _, start_rot_rad, _ = PhysicalVolumePlacement.decompose_matrix(start_transform_matrix)
+        translation_dists = -width * (number - 1) * 0.5 + np.arange(number) * width + offset
+        algo_positions = np.outer(translation_dists, axis_vec)
+        final_positions = algo_positions @ start_transform_matrix[:3, :3].T + start_transform_matrix[:3, 3]
 
-            final_pos, final_rot_rad, _ = PhysicalVolumePlacement.decompose_matrix(final_local_matrix)
+        for i in range(number):
+            final_pos = dict(zip('xyz', final_positions[i]))
+            final_rot_rad = dict(start_rot_rad)
 
             temp_pv = PhysicalVolumePlacement(
                 name=f"{lv.name}_replica_{i}",
@@ -1,13 +1,22 @@
 # src/project_manager.py
+import ast
+import graphlib
 import json
 import math
 import tempfile
 import os
 import re
+import sys
+import copy
+import contextlib
+import functools
+import hashlib
+import uuid
 import numpy as np
+from collections import OrderedDict
+from types import MappingProxyType
 from datetime import datetime
 from scipy.spatial.transform import Rotation as R
-import shutil
 
 from .geometry_types import GeometryState, Solid, Define, Material, Element, Isotope, \
                             LogicalVolume, PhysicalVolumePlacement, Assembly, ReplicaVolume, \
@@ -15,9 +24,181 @@ from .geometry_types import GeometryState, Solid, Define, Material, Element, Iso
                             BorderSurface, ParticleSource
 from .gdml_parser import GDMLParser
 from .gdml_writer import GDMLWriter
-from .step_parser import parse_step_file
 
 AUTOSAVE_VERSION_ID = "autosave"
+STEP_CACHE_SIZE = 8 # Number of parsed STEP files kept for re-imports
+STEP_READ_CHUNK_SIZE = 1 << 20 # 1 MiB buffer when streaming STEP uploads to disk
+
+# Read-only default vectors; copied only when a default actually has to be returned
+_ZERO_VEC = MappingProxyType({'x': 0, 'y': 0, 'z': 0})
+_UNIT_VEC = MappingProxyType({'x': 1, 'y': 1, 'z': 1})
+
+# Suffix of a flattened matrix entry name, e.g. the '_0_1' in 'M_0_1'
+_MATRIX_ENTRY_SUFFIX = re.compile(r'(_\d+)+$')
+
+# LV content types whose content is a single procedural object (ReplicaVolume, DivisionVolume, ParamVolume)
+_PROCEDURAL_CONTENT_TYPES = frozenset(['replica', 'division', 'parameterised'])
+
+# Expressions _convert_ai_rotation_to_g4 passes through as a plain "0" instead of negating
+_ZERO_LITERALS = frozenset(['0', '0.0'])
+
+# Material attributes evaluated by recalculate_geometry_state (Stage 2)
+_EVALUATED_MATERIAL_KEYS = frozenset(['Z_expr', 'A_expr', 'density_expr'])
+
+# Solid parameters that take the solid's default lunit / aunit
+_LENGTH_ATTRS = frozenset(['x', 'y', 'z', 'rmin', 'rmax', 'r', 'dx', 'dy', 'dz', 'dx1', 'dx2', 'dy1', 'y2', 'rtor', 'ax', 'by', 'cz', 'zcut1', 'zcut2', 'zmax', 'zcut', 'rlo', 'rhi', 'rmin1', 'rmax1', 'rmin2', 'rmax2', 'x1', 'x2', 'y1', 'x3', 'x4'])
+_ANGLE_ATTRS = frozenset(['startphi', 'deltaphi', 'starttheta', 'deltatheta', 'alpha', 'theta', 'phi', 'inst', 'outst', 'PhiTwist', 'alpha1', 'alpha2', 'Alph', 'Theta', 'Phi', 'twistedangle'])
+
+@functools.lru_cache(maxsize=4096)
+def _scaled_expression(expr_str, unit_str):
+    """
+    Returns '(expr) * unit'. Cached so every recalculation hands the evaluator the
+    same string objects (with their hashes already computed) instead of new ones.
+    """
+    return f"({expr_str}) * {unit_str}"
+
+# Plain integer literal as written in GDML copynumber / replica number attributes
+_INT_LITERAL = re.compile(r'\s*-?(0|[1-9]\d*)\s*')
+
+@functools.lru_cache(maxsize=4096)
+def _int_literal(expr_str):
+    """Returns the int value of an integer-literal expression, or None if it needs evaluating."""
+    if _INT_LITERAL.fullmatch(expr_str):
+        return int(expr_str)
+    return None
+
+# --- Solid parameter normalization: evaluated raw parameters (p) -> _evaluated_parameters (ep) ---
+
+def _normalize_scaled_solid(p, ep):
+    # For scaled solids, the evaluated params are the scale dict and the solid_ref
+    ep['scale'] = p.get('scale', {'x': 1.0, 'y': 1.0, 'z': 1.0})
+    ep['solid_ref'] = p.get('solid_ref')
+
+def _normalize_box(p, ep):
+    ep['x'] = p.get('x', 0)
+    ep['y'] = p.get('y', 0)
+    ep['z'] = p.get('z', 0)
+
+def _normalize_tube(p, ep):
+    ep['rmin'] = p.get('rmin', 0)
+    ep['rmax'] = p.get('rmax', 10)
+    ep['z'] = p.get('z', 20)
+    ep['startphi'] = p.get('startphi', 0)
+    ep['deltaphi'] = p.get('deltaphi', 2 * math.pi) # Default is a full circle
+
+def _normalize_cone(p, ep):
+    ep['rmin1'] = p.get('rmin1', 0)
+    ep['rmax1'] = p.get('rmax1', 10)
+    ep['rmin2'] = p.get('rmin2', 0)
+    ep['rmax2'] = p.get('rmax2', 10)
+    ep['z']     = p.get('z', 0)
+    ep['startphi'] = p.get('startphi', 0)
+    ep['deltaphi'] = p.get('deltaphi', 2 * math.pi)
+
+def _normalize_sphere(p, ep):
+    ep['rmin'] = p.get('rmin', 0)
+    ep['rmax'] = p.get('rmax', 10)
+    ep['startphi'] = p.get('startphi', 0)
+    ep['deltaphi'] = p.get('deltaphi', 2 * math.pi)
+    ep['starttheta'] = p.get('starttheta', 0)
+    ep['deltatheta'] = p.get('deltatheta', math.pi)
+
+def _normalize_trd(p, ep):
+    ep['dx1'] = p.get('x1', 0) / 2.0
+    ep['dx2'] = p.get('x2', 0) / 2.0
+    ep['dy1'] = p.get('y1', 0) / 2.0
+    ep['dy2'] = p.get('y2', 0) / 2.0
+    ep['dz'] = p.get('z', 0) / 2.0
+
+def _normalize_para(p, ep):
+    ep['x'] = p.get('x', 0)
+    ep['y'] = p.get('y', 0)
+    ep['z'] = p.get('z', 0)
+    ep['alpha'] = p.get('alpha', 0)
+    ep['theta'] = p.get('theta', 0)
+    ep['phi'] = p.get('phi', 0)
+
+def _normalize_hype(p, ep):
+    ep['z'] = p.get('z', 0)
+    ep['rmin'] = p.get('rmin', 0)
+    ep['rmax'] = p.get('rmax', 0)
+    ep['inst'] = p.get('inst', 0)
+    ep['outst'] = p.get('outst', 0)
+
+def _normalize_trap(p, ep):
+    ep['z'] = p.get('z', 0) / 2.0
+    ep['theta'] = p.get('theta', 0)
+    ep['phi'] = p.get('phi', 0)
+    ep['y1'] = p.get('y1', 0) / 2.0
+    ep['x1'] = p.get('x1', 0) / 2.0
+    ep['x2'] = p.get('x2', 0) / 2.0
+    ep['alpha1'] = p.get('alpha1', 0)
+    ep['y2'] = p.get('y2', 0) / 2.0
+    ep['x3'] = p.get('x3', 0) / 2.0
+    ep['x4'] = p.get('x4', 0) / 2.0
+    ep['alpha2'] = p.get('alpha2', 0)
+
+def _normalize_twisted_box(p, ep):
+    ep['PhiTwist'] = p.get('PhiTwist', 0)
+    ep['x'] = p.get('x', 0) / 2.0
+    ep['y'] = p.get('y', 0) / 2.0
+    ep['z'] = p.get('z', 0) / 2.0
+
+def _normalize_twisted_trd(p, ep):
+    ep['PhiTwist'] = p.get('PhiTwist', 0)
+    ep['x1'] = p.get('x1', 0) / 2.0
+    ep['x2'] = p.get('x2', 0) / 2.0
+    ep['y1'] = p.get('y1', 0) / 2.0
+    ep['y2'] = p.get('y2', 0) / 2.0
+    ep['z'] = p.get('z', 0) / 2.0
+
+def _normalize_twisted_trap(p, ep):
+    ep['PhiTwist'] = p.get('PhiTwist', 0)
+    ep['z'] = p.get('z', 0)
+    ep['Theta'] = p.get('Theta', 0)
+    ep['Phi'] = p.get('Phi', 0)
+    ep['y1'] = p.get('y1', 0)
+    ep['x1'] = p.get('x1', 0)
+    ep['x2'] = p.get('x2', 0)
+    ep['y2'] = p.get('y2', 0)
+    ep['x3'] = p.get('x3', 0)
+    ep['x4'] = p.get('x4', 0)
+    ep['Alph'] = p.get('Alph', 0)
+
+def _normalize_twisted_tubs(p, ep):
+    ep['twistedangle'] = p.get('twistedangle', 0)
+    ep['endinnerrad'] = p.get('endinnerrad', 0)
+    ep['endouterrad'] = p.get('endouterrad', 0)
+    ep['zlen'] = p.get('zlen', 0) / 2.0
+    ep['phi'] = p.get('phi', 2 * math.pi)
+
+def _normalize_generic_polycone(p, ep):
+    ep['startphi'] = p.get('startphi', 0)
+    ep['deltaphi'] = p.get('deltaphi', 2 * math.pi)
+    ep['rzpoints'] = p.get('rzpoints', [])
+
+def _normalize_generic_polyhedra(p, ep):
+    _normalize_generic_polycone(p, ep)
+    ep['numsides'] = p.get('numsides', 32)
+
+# Solid types whose normalization only depends on their own evaluated parameters
+_SOLID_NORMALIZERS = {
+    'scaledSolid': _normalize_scaled_solid,
+    'box': _normalize_box,
+    'tube': _normalize_tube,
+    'cone': _normalize_cone,
+    'sphere': _normalize_sphere,
+    'trd': _normalize_trd,
+    'para': _normalize_para,
+    'hype': _normalize_hype,
+    'trap': _normalize_trap,
+    'twistedbox': _normalize_twisted_box,
+    'twistedtrd': _normalize_twisted_trd,
+    'twistedtrap': _normalize_twisted_trap,
+    'twistedtubs': _normalize_twisted_tubs,
+    'genericPolycone': _normalize_generic_polycone,
+    'genericPolyhedra': _normalize_generic_polyhedra,
+}
 
 class ProjectManager:
     def __init__(self, expression_evaluator):
@@ -34,6 +215,10 @@ class ProjectManager:
         self._is_transaction_open = False
         self._pre_transaction_state = None
 
+        # --- Deferred recalculation for multi-step operations (see _deferred_recalculation) ---
+        self._recalc_depth = 0
+        self._recalc_pending = False
+
         # --- Project Management ---
         self.project_name = "untitled"
         self.projects_dir = "projects"
@@ -44,6 +229,24 @@ class ProjectManager:
         # --- Track changed objects (for now only tracking certain solids) ---
         self.changed_object_ids = {'solids': set(), 'sources': set() } #, 'lvs': set(), 'defines': set()}
 
+        # --- Cache of parsed STEP files, keyed by content hash + import options ---
+        self._step_cache = OrderedDict()
+
+        # --- Dependency info from the last full recalculation (for incremental define edits) ---
+        self._define_graph = {}              # define name -> names of the defines it references
+        self._external_define_refs = set()   # names read by materials, solids, placements and sources
+        self._evaluated_state = None         # state the evaluator's symbol table currently reflects
+
+        # --- Last JSON dumps of the project as (state, {pretty: string}); dropped on any edit or recalculation ---
+        self._saved_json = None
+
+        # --- PV id -> (containing LV or Assembly, placement) for the current state; rebuilt lazily, dropped on any edit ---
+        self._pv_index = None
+        self._pv_index_state = None
+
+        # --- group_type -> (ui_groups list, group name -> group dict); rebuilt whenever the list object changes ---
+        self._group_index = {}
+
     def _clear_change_tracker(self):
         self.changed_object_ids = {key: set() for key in self.changed_object_ids}
 
@@ -72,8 +275,8 @@ class ProjectManager:
         # The file inside is named version.json, just like any other version
         version_filepath = os.path.join(autosave_version_dir, "version.json")
         
-        # Save the current state as a JSON string
-        json_string = self.save_project_to_json_string()
+        # Save the current state as a JSON string (compact: only ever read back by the app)
+        json_string = self.save_project_to_json_string(pretty=False)
 
         with open(version_filepath, 'w') as f:
             f.write(json_string)
@@ -187,9 +390,31 @@ class ProjectManager:
             # Now, capture the single, final state of the entire operation.
             self._capture_history_state(description)
 
+    @contextlib.contextmanager
+    def _deferred_recalculation(self):
+        """
+        Within this block recalculate_geometry_state only marks the state as needing
+        recalculation; it runs once when the outermost block exits. Only for operations
+        whose intermediate steps never read evaluated values.
+        """
+        self._recalc_depth += 1
+        try:
+            yield
+        finally:
+            self._recalc_depth -= 1
+            if self._recalc_depth == 0 and self._recalc_pending:
+                self._recalc_pending = False
+                self.recalculate_geometry_state()
+
     def _capture_history_state(self, description=""):
         """Captures the current state for undo/redo."""
 
+        # Any edit may add new references to defines, so the dependency info
+        # recorded by the last full recalculation can no longer be trusted
+        self._evaluated_state = None
+        self._saved_json = None
+        self._pv_index = None
+
         # --- Don't capture state if transaction is open ---
         if self._is_transaction_open:
             # print("Transaction open, skipping intermediate history capture.")
@@ -213,6 +438,22 @@ class ProjectManager:
         # Mark project as having changes
         self.is_changed = True
 
+    def _capture_history_state_keeping_evaluation(self, description=""):
+        """
+        Captures history for an edit that leaves the dependency info of the last
+        full recalculation valid (no new references to defines can appear, or
+        they have already been recorded, as recalculate_placements/solids do).
+        """
+        evaluated_state = self._evaluated_state
+        self._capture_history_state(description)
+        self._evaluated_state = evaluated_state
+
+    def _recalculate_if_stale(self):
+        """Recalculates unless the last full recalculation is still current."""
+        if self._evaluated_state is not self.current_geometry_state:
+            return self.recalculate_geometry_state()
+        return True, None
+
     def undo(self):
         """Reverts to the previous state in history and recalculates it."""
         if self.history_index > 0:
@@ -259,27 +500,104 @@ class ProjectManager:
         # Check content_type and iterate through the correct list
         if parent_lv.content_type != 'physvol' or not parent_lv.content:
             return 1
-        
-        max_copy_no = 0
-        for pv in parent_lv.content:
-            if pv.copy_number > max_copy_no:
-                max_copy_no = pv.copy_number
-        return max_copy_no + 1
+        # Computed once per batch; callers increment locally from here on.
+        return max(0, max(pv.copy_number for pv in parent_lv.content)) + 1
+
+    def _define_dependencies(self, define_obj, defines):
+        """Returns the names of the defines that a define's expressions reference."""
+        raw = define_obj.raw_expression
+        if define_obj.type in ['position', 'rotation', 'scale']:
+            expressions = [raw[axis] for axis in ['x', 'y', 'z'] if axis in raw]
+        elif define_obj.type == 'matrix':
+            expressions = [raw.get('coldim', '0'), *raw.get('values', [])]
+        else:
+            expressions = [raw]
 
-    def recalculate_geometry_state(self):
+        deps = set()
+        try:
+            for expr in expressions:
+                for node in ast.walk(ast.parse(str(expr), mode='eval')):
+                    if isinstance(node, ast.Name):
+                        # Flattened matrix entries (M_0_1) depend on their matrix (M)
+                        ref = node.id if node.id in defines else _MATRIX_ENTRY_SUFFIX.sub('', node.id)
+                        if ref in defines and ref != define_obj.name:
+                            deps.add(ref)
+        except (SyntaxError, AttributeError, TypeError):
+            pass # Malformed expressions are reported when they are evaluated
+        return deps
+
+    def _evaluate_define(self, define_obj):
+        """Evaluates a single define and publishes its value(s) to the symbol table."""
+        evaluator = self.expression_evaluator
+        # For compound types, evaluate each axis expression.
+        if define_obj.type in ['position', 'rotation', 'scale']:
+            val_dict = {}
+            raw_dict = define_obj.raw_expression
+            # We handle units on the GDML side by multiplying in the expression string now
+            # but we still need to apply the default unit from the parent tag if it exists.
+            unit_str = define_obj.unit
+            for axis in ['x', 'y', 'z']:
+                if axis in raw_dict:
+                    expr_to_eval = str(raw_dict[axis])
+                    # If a unit is defined on the parent tag, apply it
+                    if unit_str:
+                        expr_to_eval = _scaled_expression(expr_to_eval, unit_str)
+                    _, val = evaluator.evaluate(expr_to_eval)
+                    val_dict[axis] = val
+
+                    # NOTE: Account for a difference in rotation angle sense in THREE.js and GDML
+                    if(define_obj.type == 'rotation'): val_dict[axis] *= -1
+
+            # Set define value and add to symbol table
+            define_obj.value = val_dict
+            evaluator.add_symbol(define_obj.name, val_dict)
+
+        elif define_obj.type == 'matrix':
+            raw_dict = define_obj.raw_expression
+            coldim = int(evaluator.evaluate(str(raw_dict['coldim']))[1])
+            
+            evaluated_values = [evaluator.evaluate(str(v))[1] for v in raw_dict['values']]
+            define_obj.value = evaluated_values # Store the flat list of numbers
+
+            # Now, expand the matrix into the symbol table like Geant4 does
+            if coldim <= 0:
+                raise ValueError("Matrix coldim must be > 0")
+            if len(evaluated_values) % coldim != 0:
+                raise ValueError("Number of values is not a multiple of coldim")
+
+            if len(evaluated_values) == coldim or coldim == 1: # 1D array
+                 for i, val in enumerate(evaluated_values):
+                    evaluator.add_symbol(f"{define_obj.name}_{i}", val)
+            else: # 2D array
+                num_rows = len(evaluated_values) // coldim
+                for r in range(num_rows):
+                    for c in range(coldim):
+                        evaluator.add_symbol(f"{define_obj.name}_{r}_{c}", evaluated_values[r * coldim + c])
+
+        else: # constant, quantity, expression
+            expr_to_eval = str(define_obj.raw_expression)
+            unit_str = define_obj.unit
+            if unit_str:
+                 expr_to_eval = _scaled_expression(expr_to_eval, unit_str)
+            _, val = evaluator.evaluate(expr_to_eval)
+
+            # Set define value and add to symbol table
+            define_obj.value = val
+            evaluator.add_symbol(define_obj.name, val)
+
+    def _transform_evaluator(self):
         """
-        This is the core evaluation engine for the entire project.
-        Recalculates defines, then material properties, then solid parameters,
-        and finally placement transforms, respecting all dependencies.
+        Returns evaluate_transform_part(part_data, default_val, rotation=False), which
+        evaluates a position/rotation/scale (a define reference or a dict of expressions)
+        against the current symbol table.
         """
-        if not self.current_geometry_state:
-            return False, "No project state to calculate."
-
-        state = self.current_geometry_state
+        # Placements often repeat the same transform expressions; evaluate each
+        # distinct (expressions, default, rotation) signature once per recalculation.
+        # The resulting dicts are shared between placements and treated as read-only,
+        # just like the define values handed out for define references.
+        transform_results = {}
         evaluator = self.expression_evaluator
-        evaluator.clear_symbols() # Clear old symbols
 
-        # Helper function for evaluating transforms ##
         def evaluate_transform_part(part_data, default_val, rotation=False):
 
             # Negate Euler angles for rotations
@@ -287,8 +605,17 @@ class ProjectManager:
             if(rotation): rotation_factor = -1
 
             if isinstance(part_data, str): # It's a reference to a define
-                return evaluator.get_symbol(part_data, default_val)
+                value = evaluator.get_symbol(part_data, None)
+                return value if value is not None else dict(default_val)
             elif isinstance(part_data, dict): # It's a dict of expressions
+                try:
+                    signature = (tuple(part_data.items()), id(default_val), rotation)
+                    cached = transform_results.get(signature)
+                except TypeError: # Unhashable expression values; evaluate directly
+                    signature = cached = None
+                if cached is not None:
+                    return cached
+
                 evaluated_dict = {}
                 for axis, raw_expr in part_data.items():
                     try:
@@ -299,92 +626,172 @@ class ProjectManager:
                             evaluated_dict[axis] = evaluator.evaluate(str(raw_expr))[1]*rotation_factor
                     except Exception:
                         evaluated_dict[axis] = default_val.get(axis, 0)
+                if signature is not None:
+                    transform_results[signature] = evaluated_dict
                 return evaluated_dict
-            return default_val
+            return dict(default_val)
+
+        return evaluate_transform_part
+
+    def _evaluate_solid(self, solid, evaluate_transform_part):
+        """Evaluates and normalizes one solid's parameters into solid._evaluated_parameters (Stage 3)."""
+        evaluator = self.expression_evaluator
+        solid._evaluated_parameters = {}
+        raw_params = solid.raw_parameters
         
-        # --- Stage 1: Iteratively resolve all defines ---
-        unresolved_defines = list(state.defines.values())
-        max_passes = len(unresolved_defines) + 2
-        for _ in range(max_passes):
-            if not unresolved_defines: break
+        default_lunit = raw_params.get('lunit')
+        default_aunit = raw_params.get('aunit')
+
+        # First, evaluate all expressions into a temporary dictionary
+        temp_eval_params = {}
+        for key, raw_expr in raw_params.items():
+            if key in ['lunit', 'aunit']: continue
             
-            resolved_this_pass = False
-            still_unresolved = []
-            for define_obj in unresolved_defines:
+            # Handle "scale" key for scaledSolid
+            if key == 'scale' and isinstance(raw_expr, dict):
+                evaluated_scale = {}
+                for axis, axis_expr in raw_expr.items():
+                    try:
+                        evaluated_scale[axis] = evaluator.evaluate(str(axis_expr))[1]
+                    except Exception as e:
+                        print(f"Warning: Could not eval scale param '{axis}' for solid '{solid.name}': {e}")
+                        evaluated_scale[axis] = 1.0 # Default to 1 on failure
+                temp_eval_params[key] = evaluated_scale
+            # Handle "solid_ref" key for scaledSolid: just pass it along
+            elif key == 'solid_ref' and isinstance(raw_expr, str):
+                temp_eval_params[key] = raw_expr
+            elif isinstance(raw_expr, (str, int, float)):
+
+                # Add default units to expression
+                expr_to_eval = str(raw_expr)
+                if key in _LENGTH_ATTRS and default_lunit:
+                    expr_to_eval = _scaled_expression(expr_to_eval, default_lunit)
+                elif key in _ANGLE_ATTRS and default_aunit:
+                    expr_to_eval = _scaled_expression(expr_to_eval, default_aunit)
+
                 try:
-                    # For compound types, evaluate each axis expression.
-                    if define_obj.type in ['position', 'rotation', 'scale']:
-                        val_dict = {}
-                        raw_dict = define_obj.raw_expression
-                        # We handle units on the GDML side by multiplying in the expression string now
-                        # but we still need to apply the default unit from the parent tag if it exists.
-                        unit_str = define_obj.unit
-                        for axis in ['x', 'y', 'z']:
-                            if axis in raw_dict:
-                                expr_to_eval = str(raw_dict[axis])
-                                # If a unit is defined on the parent tag, apply it
-                                if unit_str:
-                                    expr_to_eval = f"({expr_to_eval}) * {unit_str}"
-                                _, val = evaluator.evaluate(expr_to_eval)
-                                val_dict[axis] = val
-
-                                # NOTE: Account for a difference in rotation angle sense in THREE.js and GDML
-                                if(define_obj.type == 'rotation'): val_dict[axis] *= -1
-
-                        # Set define value and add to symbol table
-                        define_obj.value = val_dict
-                        evaluator.add_symbol(define_obj.name, val_dict)
-
-                    elif define_obj.type == 'matrix':
-                        raw_dict = define_obj.raw_expression
-                        coldim = int(evaluator.evaluate(str(raw_dict['coldim']))[1])
-                        
-                        evaluated_values = [evaluator.evaluate(str(v))[1] for v in raw_dict['values']]
-                        define_obj.value = evaluated_values # Store the flat list of numbers
-
-                        # Now, expand the matrix into the symbol table like Geant4 does
-                        if coldim <= 0:
-                            raise ValueError("Matrix coldim must be > 0")
-                        if len(evaluated_values) % coldim != 0:
-                            raise ValueError("Number of values is not a multiple of coldim")
-
-                        if len(evaluated_values) == coldim or coldim == 1: # 1D array
-                             for i, val in enumerate(evaluated_values):
-                                evaluator.add_symbol(f"{define_obj.name}_{i}", val)
-                        else: # 2D array
-                            num_rows = len(evaluated_values) // coldim
-                            for r in range(num_rows):
-                                for c in range(coldim):
-                                    evaluator.add_symbol(f"{define_obj.name}_{r}_{c}", evaluated_values[r * coldim + c])
-
-                    else: # constant, quantity, expression
-                        expr_to_eval = str(define_obj.raw_expression)
-                        unit_str = define_obj.unit
-                        if unit_str:
-                             expr_to_eval = f"({expr_to_eval}) * {unit_str}"
-                        _, val = evaluator.evaluate(expr_to_eval)
-
-                        # Set define value and add to symbol table
-                        define_obj.value = val
-                        evaluator.add_symbol(define_obj.name, val)
-
-                    resolved_this_pass = True
-
-                except (NameError, KeyError, TypeError):
-                    still_unresolved.append(define_obj) # Depends on another define, try again next pass
+                    temp_eval_params[key] = evaluator.evaluate(expr_to_eval)[1]
                 except Exception as e:
-                    print(f"Error evaluating define '{define_obj.name}': {e}. Setting value to None.")
-                    define_obj.value = None
-                    resolved_this_pass = True # Consider it "resolved" to avoid infinite loops
-
-            if not resolved_this_pass and still_unresolved:
-                unresolved_names = [d.name for d in unresolved_defines]
-                return False, f"Could not resolve defines (circular dependency or missing variable): {unresolved_names}"
-            unresolved_defines = still_unresolved
+                    print(f"Warning: Could not eval solid param '{key}' for solid '{solid.name}' with expression '{expr_to_eval}': {e}")
+                    temp_eval_params[key] = float('nan')
+            else:
+                temp_eval_params[key] = raw_expr
+
+        # Second pass for normalization ##
+        p = temp_eval_params
+        ep = solid._evaluated_parameters
+
+        solid_type = solid.type
+        normalize = _SOLID_NORMALIZERS.get(solid_type)
+        if normalize is not None:
+            normalize(p, ep)
+
+        elif solid_type == 'reflectedSolid':
+            ep['solid_ref'] = p.get('solid_ref')
+            transform = p.get('transform', {})
+            ep['transform'] = {
+                '_evaluated_position': evaluate_transform_part(transform.get('position'), _ZERO_VEC, rotation=False),
+                '_evaluated_rotation': evaluate_transform_part(transform.get('rotation'), _ZERO_VEC, rotation=True),
+                '_evaluated_scale': evaluate_transform_part(transform.get('scale'), _UNIT_VEC, rotation=False)
+            }
+
+        elif solid_type == 'xtru':
+            # Evaluate all the nested dictionaries of expressions
+            ep['twoDimVertices'] = []
+            for v in p.get('twoDimVertices', []):
+                ep['twoDimVertices'].append({
+                    'x': evaluator.evaluate(str(v.get('x', '0')))[1],
+                    'y': evaluator.evaluate(str(v.get('y', '0')))[1]
+                })
             
+            ep['sections'] = []
+            for s in p.get('sections', []):
+                ep['sections'].append({
+                    'zOrder': int(evaluator.evaluate(str(s.get('zOrder', '0')))[1]),
+                    'zPosition': evaluator.evaluate(str(s.get('zPosition', '0')))[1],
+                    'xOffset': evaluator.evaluate(str(s.get('xOffset', '0')))[1],
+                    'yOffset': evaluator.evaluate(str(s.get('yOffset', '0')))[1],
+                    'scalingFactor': evaluator.evaluate(str(s.get('scalingFactor', '1.0')))[1]
+                })
+            # Sort sections by zOrder just in case
+            ep['sections'].sort(key=lambda s: s['zOrder'])
+
+        else:
+            # For all other solids, just copy the evaluated params.
+            # This is safe because their parameters are generally all required.
+            solid._evaluated_parameters = p
+
+    def _evaluate_recipe_transforms(self, solid, evaluate_transform_part):
+        """Evaluates the transforms inside a boolean solid's recipe (Stage 5)."""
+        recipe = solid.raw_parameters.get('recipe', [])
+        for item in recipe:
+            transform = item.get('transform')
+            if not transform:
+                continue # Most recipe items (e.g. the base) carry no transform
+            position = transform.get('position')
+            rotation = transform.get('rotation')
+            if not (position or rotation):
+                # Identity transform: nothing to evaluate; the viewer defaults missing values to zero
+                transform.pop('_evaluated_position', None)
+                transform.pop('_evaluated_rotation', None)
+                continue
+            # Use the same helper to evaluate the nested transforms
+            transform['_evaluated_position'] = evaluate_transform_part(position, _ZERO_VEC)
+            if rotation is None:
+                transform['_evaluated_rotation'] = dict(_ZERO_VEC)
+            else:
+                transform['_evaluated_rotation'] = evaluate_transform_part(rotation, _ZERO_VEC)
+
+    def recalculate_geometry_state(self):
+        """
+        This is the core evaluation engine for the entire project.
+        Recalculates defines, then material properties, then solid parameters,
+        and finally placement transforms, respecting all dependencies.
+        """
+        if not self.current_geometry_state:
+            return False, "No project state to calculate."
+
+        if self._recalc_depth:
+            self._recalc_pending = True
+            return True, None
+
+        state = self.current_geometry_state
+        evaluator = self.expression_evaluator
+        evaluator.clear_symbols() # Clear old symbols
+        self._evaluated_state = None
+        self._saved_json = None
+        self._pv_index = None
+
+        evaluate_transform_part = self._transform_evaluator()
+
+        # --- Stage 1: Resolve all defines in dependency order ---
+        define_graph = {name: self._define_dependencies(define_obj, state.defines)
+                        for name, define_obj in state.defines.items()}
+        try:
+            define_order = list(graphlib.TopologicalSorter(define_graph).static_order())
+        except graphlib.CycleError as e:
+            # graphlib lists each node before the nodes that depend on it; reversed, each define references the next
+            cycle = ' -> '.join(reversed(e.args[1]))
+            return False, f"Could not resolve defines (circular dependency): {cycle}"
+
+        unresolved_defines = []
+        for name in define_order:
+            define_obj = state.defines[name]
+            try:
+                self._evaluate_define(define_obj)
+            except (NameError, KeyError, TypeError):
+                unresolved_defines.append(define_obj)
+            except Exception as e:
+                print(f"Error evaluating define '{define_obj.name}': {e}. Setting value to None.")
+                define_obj.value = None
+
         if unresolved_defines:
             return False, f"Could not resolve all defines. Unresolved: {[d.name for d in unresolved_defines]}"
 
+        # Record which symbols the remaining stages read, so later define edits
+        # that nothing else depends on can skip them
+        evaluator.start_recording_names()
+
         # --- Stage 2: Evaluate Material properties (Z, A, density) ---
         for material in state.materials.values():
             try:
@@ -400,220 +807,32 @@ class ProjectManager:
 
         # --- Stage 3: Evaluate and NORMALIZE solid parameters ---
         for solid in state.solids.values():
-            solid._evaluated_parameters = {}
-            raw_params = solid.raw_parameters
-            
-            default_lunit = raw_params.get('lunit')
-            default_aunit = raw_params.get('aunit')
-
-            length_attrs = ['x', 'y', 'z', 'rmin', 'rmax', 'r', 'dx', 'dy', 'dz', 'dx1', 'dx2', 'dy1', 'y2', 'rtor', 'ax', 'by', 'cz', 'zcut1', 'zcut2', 'zmax', 'zcut', 'rlo', 'rhi', 'rmin1', 'rmax1', 'rmin2', 'rmax2', 'x1', 'x2', 'y1', 'x3', 'x4']
-            angle_attrs = ['startphi', 'deltaphi', 'starttheta', 'deltatheta', 'alpha', 'theta', 'phi', 'inst', 'outst', 'PhiTwist', 'alpha1', 'alpha2', 'Alph', 'Theta', 'Phi', 'twistedangle']
-
-            # First, evaluate all expressions into a temporary dictionary
-            temp_eval_params = {}
-            for key, raw_expr in raw_params.items():
-                if key in ['lunit', 'aunit']: continue
-                
-                # Handle "scale" key for scaledSolid
-                if key == 'scale' and isinstance(raw_expr, dict):
-                    evaluated_scale = {}
-                    for axis, axis_expr in raw_expr.items():
-                        try:
-                            evaluated_scale[axis] = evaluator.evaluate(str(axis_expr))[1]
-                        except Exception as e:
-                            print(f"Warning: Could not eval scale param '{axis}' for solid '{solid.name}': {e}")
-                            evaluated_scale[axis] = 1.0 # Default to 1 on failure
-                    temp_eval_params[key] = evaluated_scale
-                # Handle "solid_ref" key for scaledSolid: just pass it along
-                elif key == 'solid_ref' and isinstance(raw_expr, str):
-                    temp_eval_params[key] = raw_expr
-                elif isinstance(raw_expr, (str, int, float)):
-
-                    # Add default units to expression
-                    expr_to_eval = str(raw_expr)
-                    if key in length_attrs and default_lunit:
-                        expr_to_eval = f"({expr_to_eval}) * {default_lunit}"
-                    elif key in angle_attrs and default_aunit:
-                        expr_to_eval = f"({expr_to_eval}) * {default_aunit}"
-
-                    try:
-                        temp_eval_params[key] = evaluator.evaluate(expr_to_eval)[1]
-                    except Exception as e:
-                        print(f"Warning: Could not eval solid param '{key}' for solid '{solid.name}' with expression '{expr_to_eval}': {e}")
-                        temp_eval_params[key] = float('nan')
-                else:
-                    temp_eval_params[key] = raw_expr
-
-            # Second pass for normalization ##
-            p = temp_eval_params
-            ep = solid._evaluated_parameters
-
-            solid_type = solid.type
-            if solid_type == 'scaledSolid':
-                # For scaled solids, the evaluated params are the scale dict and the solid_ref
-                ep['scale'] = p.get('scale', {'x': 1.0, 'y': 1.0, 'z': 1.0})
-                ep['solid_ref'] = p.get('solid_ref')
-
-            elif solid_type == 'reflectedSolid':
-                ep['solid_ref'] = p.get('solid_ref')
-                transform = p.get('transform', {})
-                ep['transform'] = {
-                    '_evaluated_position': evaluate_transform_part(transform.get('position'), {'x': 0, 'y': 0, 'z': 0}, rotation=False),
-                    '_evaluated_rotation': evaluate_transform_part(transform.get('rotation'), {'x': 0, 'y': 0, 'z': 0}, rotation=True),
-                    '_evaluated_scale': evaluate_transform_part(transform.get('scale'), {'x': 1, 'y': 1, 'z': 1}, rotation=False)
-                }
-
-            elif solid_type == 'box':
-                ep['x'] = p.get('x', 0)
-                ep['y'] = p.get('y', 0)
-                ep['z'] = p.get('z', 0)
-            
-            elif solid_type == 'tube':
-                ep['rmin'] = p.get('rmin', 0)
-                ep['rmax'] = p.get('rmax', 10)
-                ep['z'] = p.get('z', 20)
-                ep['startphi'] = p.get('startphi', 0)
-                ep['deltaphi'] = p.get('deltaphi', 2 * math.pi) # Default is a full circle
-
-            elif solid_type == 'cone':
-                ep['rmin1'] = p.get('rmin1', 0)
-                ep['rmax1'] = p.get('rmax1', 10)
-                ep['rmin2'] = p.get('rmin2', 0)
-                ep['rmax2'] = p.get('rmax2', 10)
-                ep['z']     = p.get('z', 0)
-                ep['startphi'] = p.get('startphi', 0)
-                ep['deltaphi'] = p.get('deltaphi', 2 * math.pi)
-
-            elif solid_type == 'sphere':
-                ep['rmin'] = p.get('rmin', 0)
-                ep['rmax'] = p.get('rmax', 10)
-                ep['startphi'] = p.get('startphi', 0)
-                ep['deltaphi'] = p.get('deltaphi', 2 * math.pi)
-                ep['starttheta'] = p.get('starttheta', 0)
-                ep['deltatheta'] = p.get('deltatheta', math.pi)
-
-            elif solid_type == 'trd':
-                ep['dx1'] = p.get('x1', 0) / 2.0
-                ep['dx2'] = p.get('x2', 0) / 2.0
-                ep['dy1'] = p.get('y1', 0) / 2.0
-                ep['dy2'] = p.get('y2', 0) / 2.0
-                ep['dz'] = p.get('z', 0) / 2.0
-
-            elif solid.type == 'para':
-                ep['x'] = p.get('x', 0)
-                ep['y'] = p.get('y', 0)
-                ep['z'] = p.get('z', 0)
-                ep['alpha'] = p.get('alpha', 0)
-                ep['theta'] = p.get('theta', 0)
-                ep['phi'] = p.get('phi', 0)
-            
-            elif solid.type == 'hype':
-                 ep['z'] = p.get('z', 0)
-                 ep['rmin'] = p.get('rmin', 0)
-                 ep['rmax'] = p.get('rmax', 0)
-                 ep['inst'] = p.get('inst', 0)
-                 ep['outst'] = p.get('outst', 0)
-
-            elif solid_type == 'trap':
-                ep['z'] = p.get('z', 0) / 2.0
-                ep['theta'] = p.get('theta', 0)
-                ep['phi'] = p.get('phi', 0)
-                ep['y1'] = p.get('y1', 0) / 2.0
-                ep['x1'] = p.get('x1', 0) / 2.0
-                ep['x2'] = p.get('x2', 0) / 2.0
-                ep['alpha1'] = p.get('alpha1', 0)
-                ep['y2'] = p.get('y2', 0) / 2.0
-                ep['x3'] = p.get('x3', 0) / 2.0
-                ep['x4'] = p.get('x4', 0) / 2.0
-                ep['alpha2'] = p.get('alpha2', 0)
-                
-            elif solid_type == 'twistedbox':
-                ep['PhiTwist'] = p.get('PhiTwist', 0)
-                ep['x'] = p.get('x', 0) / 2.0
-                ep['y'] = p.get('y', 0) / 2.0
-                ep['z'] = p.get('z', 0) / 2.0
-            
-            elif solid_type == 'twistedtrd':
-                ep['PhiTwist'] = p.get('PhiTwist', 0)
-                ep['x1'] = p.get('x1', 0) / 2.0
-                ep['x2'] = p.get('x2', 0) / 2.0
-                ep['y1'] = p.get('y1', 0) / 2.0
-                ep['y2'] = p.get('y2', 0) / 2.0
-                ep['z'] = p.get('z', 0) / 2.0
-
-            elif solid_type == 'twistedtrap':
-                ep['PhiTwist'] = p.get('PhiTwist', 0)
-                ep['z'] = p.get('z', 0)
-                ep['Theta'] = p.get('Theta', 0)
-                ep['Phi'] = p.get('Phi', 0)
-                ep['y1'] = p.get('y1', 0)
-                ep['x1'] = p.get('x1', 0)
-                ep['x2'] = p.get('x2', 0)
-                ep['y2'] = p.get('y2', 0)
-                ep['x3'] = p.get('x3', 0)
-                ep['x4'] = p.get('x4', 0)
-                ep['Alph'] = p.get('Alph', 0)
-
-            elif solid_type == 'twistedtubs':
-                ep['twistedangle'] = p.get('twistedangle', 0)
-                ep['endinnerrad'] = p.get('endinnerrad', 0)
-                ep['endouterrad'] = p.get('endouterrad', 0)
-                ep['zlen'] = p.get('zlen', 0) / 2.0
-                ep['phi'] = p.get('phi', 2 * math.pi)
-
-            elif solid_type in ['genericPolycone', 'genericPolyhedra']:
-                ep['startphi'] = p.get('startphi', 0)
-                ep['deltaphi'] = p.get('deltaphi', 2 * math.pi)
-                ep['rzpoints'] = p.get('rzpoints', [])
-                if solid_type == 'genericPolyhedra':
-                    ep['numsides'] = p.get('numsides', 32)
-
-            elif solid_type == 'xtru':
-                # Evaluate all the nested dictionaries of expressions
-                ep['twoDimVertices'] = []
-                for v in p.get('twoDimVertices', []):
-                    ep['twoDimVertices'].append({
-                        'x': evaluator.evaluate(str(v.get('x', '0')))[1],
-                        'y': evaluator.evaluate(str(v.get('y', '0')))[1]
-                    })
-                
-                ep['sections'] = []
-                for s in p.get('sections', []):
-                    ep['sections'].append({
-                        'zOrder': int(evaluator.evaluate(str(s.get('zOrder', '0')))[1]),
-                        'zPosition': evaluator.evaluate(str(s.get('zPosition', '0')))[1],
-                        'xOffset': evaluator.evaluate(str(s.get('xOffset', '0')))[1],
-                        'yOffset': evaluator.evaluate(str(s.get('yOffset', '0')))[1],
-                        'scalingFactor': evaluator.evaluate(str(s.get('scalingFactor', '1.0')))[1]
-                    })
-                # Sort sections by zOrder just in case
-                ep['sections'].sort(key=lambda s: s['zOrder'])
-
-            else:
-                # For all other solids, just copy the evaluated params.
-                # This is safe because their parameters are generally all required.
-                solid._evaluated_parameters = p
+            self._evaluate_solid(solid, evaluate_transform_part)
 
         # --- Stage 4: Evaluate all placement transforms ---
 
         # Get all LVs and Assemblies to check for placements
-        all_lvs = list(state.logical_volumes.values())
-        all_asms = list(state.assemblies.values())
+        all_lvs = state.logical_volumes.values()
+        all_asms = state.assemblies.values()
 
         # Iterate through LVs to evaluate their placements
         for lv in all_lvs:
             if lv.content_type == 'physvol':
                 for pv in lv.content: # Use the new .content attribute
-                    try:
-                        pv.copy_number = int(evaluator.evaluate(str(pv.copy_number_expr))[1])
-                    except Exception as e:
-                        pv.copy_number = 0
+                    copy_expr = str(pv.copy_number_expr)
+                    copy_no = _int_literal(copy_expr)
+                    if copy_no is None:
+                        try:
+                            copy_no = int(evaluator.evaluate(copy_expr)[1])
+                        except Exception as e:
+                            copy_no = 0
+                    pv.copy_number = copy_no
                     
-                    pv._evaluated_position = evaluate_transform_part(pv.position, {'x': 0, 'y': 0, 'z': 0}, rotation=False)
-                    pv._evaluated_rotation = evaluate_transform_part(pv.rotation, {'x': 0, 'y': 0, 'z': 0}, rotation=True)
-                    pv._evaluated_scale = evaluate_transform_part(pv.scale, {'x': 1, 'y': 1, 'z': 1}, rotation=False)
+                    pv._evaluated_position = evaluate_transform_part(pv.position, _ZERO_VEC, rotation=False)
+                    pv._evaluated_rotation = evaluate_transform_part(pv.rotation, _ZERO_VEC, rotation=True)
+                    pv._evaluated_scale = evaluate_transform_part(pv.scale, _UNIT_VEC, rotation=False)
             
-            elif lv.content_type in ['replica', 'division', 'parameterised']:
+            elif lv.content_type in _PROCEDURAL_CONTENT_TYPES:
                 # For procedural placements, we need to evaluate their parameters (width, offset, etc.)
                 proc_obj = lv.content
                 if proc_obj:
@@ -628,15 +847,19 @@ class ProjectManager:
                             proc_obj._evaluated_offset = float(evaluator.evaluate(str(proc_obj.offset))[1])
                         except Exception: proc_obj._evaluated_offset = 0.0
                     if hasattr(proc_obj, 'number'):
-                        try:
-                            proc_obj._evaluated_number = int(evaluator.evaluate(str(proc_obj.number))[1])
-                        except Exception: proc_obj._evaluated_number = 0
+                        number = _int_literal(str(proc_obj.number))
+                        if number is not None:
+                            proc_obj._evaluated_number = number
+                        else:
+                            try:
+                                proc_obj._evaluated_number = int(evaluator.evaluate(str(proc_obj.number))[1])
+                            except Exception: proc_obj._evaluated_number = 0
                     
                     # Evaluate replica-specific transforms if they exist
                     if hasattr(proc_obj, 'start_position'):
-                        proc_obj._evaluated_start_position = evaluate_transform_part(proc_obj.start_position, {'x': 0, 'y': 0, 'z': 0}, rotation=False)
+                        proc_obj._evaluated_start_position = evaluate_transform_part(proc_obj.start_position, _ZERO_VEC, rotation=False)
                     if hasattr(proc_obj, 'start_rotation'):
-                        proc_obj._evaluated_start_rotation = evaluate_transform_part(proc_obj.start_rotation, {'x': 0, 'y': 0, 'z': 0}, rotation=True)
+                        proc_obj._evaluated_start_rotation = evaluate_transform_part(proc_obj.start_rotation, _ZERO_VEC, rotation=True)
 
                     # Add evaluation logic for parameterised volumes
                     if hasattr(proc_obj, 'ncopies'):
@@ -647,8 +870,8 @@ class ProjectManager:
                     if hasattr(proc_obj, 'parameters'):
                         for param_set in proc_obj.parameters:
                             # Evaluate the transform for this instance
-                            param_set._evaluated_position = evaluate_transform_part(param_set.position, {'x': 0, 'y': 0, 'z': 0}, rotation=False)
-                            param_set._evaluated_rotation = evaluate_transform_part(param_set.rotation, {'x': 0, 'y': 0, 'z': 0}, rotation=True)
+                            param_set._evaluated_position = evaluate_transform_part(param_set.position, _ZERO_VEC, rotation=False)
+                            param_set._evaluated_rotation = evaluate_transform_part(param_set.rotation, _ZERO_VEC, rotation=True)
                             
                             # Evaluate each dimension expression for this instance
                             evaluated_dims = {}
@@ -664,30 +887,128 @@ class ProjectManager:
         # Iterate through Assemblies to evaluate their placements
         for asm in all_asms:
             for pv in asm.placements:
-                try:
-                    pv.copy_number = int(evaluator.evaluate(str(pv.copy_number_expr))[1])
-                except Exception as e:
-                    pv.copy_number = 0
+                copy_expr = str(pv.copy_number_expr)
+                copy_no = _int_literal(copy_expr)
+                if copy_no is None:
+                    try:
+                        copy_no = int(evaluator.evaluate(copy_expr)[1])
+                    except Exception as e:
+                        copy_no = 0
+                pv.copy_number = copy_no
                 
-                pv._evaluated_position = evaluate_transform_part(pv.position, {'x': 0, 'y': 0, 'z': 0})
-                pv._evaluated_rotation = evaluate_transform_part(pv.rotation, {'x': 0, 'y': 0, 'z': 0})
-                pv._evaluated_scale = evaluate_transform_part(pv.scale, {'x': 1, 'y': 1, 'z': 1})
+                pv._evaluated_position = evaluate_transform_part(pv.position, _ZERO_VEC)
+                pv._evaluated_rotation = evaluate_transform_part(pv.rotation, _ZERO_VEC)
+                pv._evaluated_scale = evaluate_transform_part(pv.scale, _UNIT_VEC)
 
         ## Stage 5 - Evaluate transforms inside boolean solid recipes ##
         for solid in state.solids.values():
             if solid.type == 'boolean':
-                recipe = solid.raw_parameters.get('recipe', [])
-                for item in recipe:
-                    transform = item.get('transform', {})
-                    if transform:
-                         # Use the same helper to evaluate the nested transforms
-                         transform['_evaluated_position'] = evaluate_transform_part(transform.get('position'), {'x':0, 'y':0, 'z':0})
-                         transform['_evaluated_rotation'] = evaluate_transform_part(transform.get('rotation'), {'x':0, 'y':0, 'z':0})
+                self._evaluate_recipe_transforms(solid, evaluate_transform_part)
 
         # --- Evaluate Source Positions ---
         for source in state.sources.values():
-            source._evaluated_position = evaluate_transform_part(source.position, {'x': 0, 'y': 0, 'z': 0})
-            source._evaluated_rotation = evaluate_transform_part(source.rotation, {'x': 0, 'y': 0, 'z': 0}, rotation=True)
+            source._evaluated_position = evaluate_transform_part(source.position, _ZERO_VEC)
+            source._evaluated_rotation = evaluate_transform_part(source.rotation, _ZERO_VEC, rotation=True)
+
+        self._external_define_refs = evaluator.stop_recording_names()
+        self._define_graph = define_graph
+        self._evaluated_state = state
+
+        return True, None
+
+    def recalculate_dependents_of(self, define_name):
+        """
+        Re-evaluates a changed define and the defines that depend on it, reusing the
+        symbol table of the last full recalculation. Falls back to a full
+        recalculation whenever anything besides defines could be affected.
+        """
+        state = self.current_geometry_state
+        define_obj = state.defines.get(define_name) if state else None
+        if define_obj is None or self._evaluated_state is not state or define_name not in self._define_graph:
+            return self.recalculate_geometry_state()
+        self._saved_json = None
+
+        graph = self._define_graph
+        graph[define_name] = self._define_dependencies(define_obj, state.defines)
+
+        # Collect the changed define and everything that transitively depends on it
+        dependents = {}
+        for name, deps in graph.items():
+            for dep in deps:
+                dependents.setdefault(dep, []).append(name)
+        affected = {define_name}
+        pending = [define_name]
+        while pending:
+            for name in dependents.get(pending.pop(), ()):
+                if name not in affected:
+                    affected.add(name)
+                    pending.append(name)
+
+        # Cycles, matrices (whose flattened entries may change shape) and anything
+        # read outside the defines all need the full pass
+        if (not graph[define_name].isdisjoint(affected)
+                or not self._external_define_refs.isdisjoint(affected)
+                or any(state.defines[name].type == 'matrix' for name in affected)):
+            return self.recalculate_geometry_state()
+
+        affected_graph = {name: graph[name] & affected for name in affected}
+        for name in graphlib.TopologicalSorter(affected_graph).static_order():
+            try:
+                self._evaluate_define(state.defines[name])
+            except Exception:
+                return self.recalculate_geometry_state() # Let the full pass report the error
+
+        return True, None
+
+    def recalculate_placements(self, pvs):
+        """
+        Re-evaluates the transforms of edited placements, reusing the symbol table of
+        the last full recalculation. Nothing else reads a placement's transform, so
+        the rest of the state stays valid. Falls back to a full recalculation if the
+        state has not been fully evaluated.
+        """
+        state = self.current_geometry_state
+        if self._evaluated_state is not state:
+            return self.recalculate_geometry_state()
+        self._saved_json = None
+
+        evaluator = self.expression_evaluator
+        evaluate_transform_part = self._transform_evaluator()
+        evaluator.start_recording_names()
+        for pv in pvs:
+            container, pv = self._find_pv_container(pv.id)
+            if pv is None:
+                continue
+            # Same as Stage 4: only placements inside logical volumes negate their rotation
+            negate = not isinstance(container, Assembly)
+            pv._evaluated_position = evaluate_transform_part(pv.position, _ZERO_VEC)
+            pv._evaluated_rotation = evaluate_transform_part(pv.rotation, _ZERO_VEC, rotation=negate)
+            pv._evaluated_scale = evaluate_transform_part(pv.scale, _UNIT_VEC)
+        # The new expressions may read defines nothing read before
+        self._external_define_refs |= evaluator.stop_recording_names()
+
+        return True, None
+
+    def recalculate_solids(self, solids):
+        """
+        Re-evaluates edited solids (Stages 3 and 5 for just those solids), reusing the
+        symbol table of the last full recalculation. No other object's evaluated
+        values are derived from a solid's parameters. Falls back to a full
+        recalculation if the state has not been fully evaluated.
+        """
+        state = self.current_geometry_state
+        if self._evaluated_state is not state:
+            return self.recalculate_geometry_state()
+        self._saved_json = None
+
+        evaluator = self.expression_evaluator
+        evaluate_transform_part = self._transform_evaluator()
+        evaluator.start_recording_names()
+        for solid in solids:
+            self._evaluate_solid(solid, evaluate_transform_part)
+            if solid.type == 'boolean':
+                self._evaluate_recipe_transforms(solid, evaluate_transform_part)
+        self._external_define_refs |= evaluator.stop_recording_names()
 
         return True, None
 
@@ -716,9 +1037,25 @@ class ProjectManager:
             return self.current_geometry_state.get_threejs_scene_description()
         return []
 
-    def save_project_to_json_string(self):
-        if self.current_geometry_state:
-            return json.dumps(self.current_geometry_state.to_dict(), indent=2)
+    def save_project_to_json_string(self, pretty=True):
+        """
+        Serializes the project to JSON. pretty=False writes compact JSON for
+        files nobody reads by hand, such as the autosave.
+        """
+        state = self.current_geometry_state
+        if state:
+            # Autosave, version saves and AI prompts often dump the same unchanged state
+            if self._saved_json is None or self._saved_json[0] is not state:
+                self._saved_json = (state, {})
+            dumps = self._saved_json[1]
+            json_string = dumps.get(pretty)
+            if json_string is None:
+                if pretty:
+                    json_string = json.dumps(state.to_dict(), indent=2)
+                else:
+                    json_string = json.dumps(state.to_dict(), separators=(',', ':'))
+                dumps[pretty] = json_string
+            return json_string
         return "{}"
 
     def load_project_from_json_string(self, json_string):
@@ -805,28 +1142,8 @@ class ProjectManager:
         elif object_type == "border_surface":
             obj = state.border_surfaces.get(object_name_or_id)
         elif object_type == "physical_volume":
-            # Search through all logical volumes to find the PV
-            all_lvs = list(state.logical_volumes.values())
-            for lv in all_lvs:
-                # We only search in LVs that contain physical placements
-                if lv.content_type == 'physvol':
-                    for pv in lv.content:
-                        if pv.id == object_name_or_id:
-                            obj = pv
-                            break
-                if obj:
-                    break
-            
-            # Also search through assemblies (important for completeness)
-            if not obj:
-                all_asms = list(state.assemblies.values())
-                for asm in all_asms:
-                    for pv in asm.placements:
-                        if pv.id == object_name_or_id:
-                            obj = pv
-                            break
-                    if obj:
-                        break
+            # Placements in both logical volumes and assemblies
+            obj = self._find_pv_by_id(object_name_or_id)
         
         elif object_type == "particle_source":
             # Search in sources dict. 
@@ -846,35 +1163,19 @@ class ProjectManager:
         # This needs careful implementation to find the object and update its property.
         # Example for a physical volume's position.x:
         if not self.current_geometry_state: return False
+        state = self.current_geometry_state
         print(f"Attempting to update: Type='{object_type}', ID/Name='{object_id}', Path='{property_path}', NewValue='{new_value}'")
 
         target_obj = None
 
         # Handle all possible object types.
-        if object_type == "define": target_obj = self.current_geometry_state.defines.get(object_id)
-        elif object_type == "material": target_obj = self.current_geometry_state.materials.get(object_id)
-        elif object_type == "solid": target_obj = self.current_geometry_state.solids.get(object_id)
-        elif object_type == "logical_volume": target_obj = self.current_geometry_state.logical_volumes.get(object_id)
+        if object_type == "define": target_obj = state.defines.get(object_id)
+        elif object_type == "material": target_obj = state.materials.get(object_id)
+        elif object_type == "solid": target_obj = state.solids.get(object_id)
+        elif object_type == "logical_volume": target_obj = state.logical_volumes.get(object_id)
         elif object_type == "physical_volume":
-
-            # Iterate through LVs and Assemblies
-            all_lvs = list(self.current_geometry_state.logical_volumes.values())
-            for lv in all_lvs:
-                if lv.content_type == 'physvol':
-                    for pv in lv.content:
-                        if pv.id == object_id:
-                            target_obj = pv
-                            break
-                if target_obj: break
-            
-            if not target_obj:
-                all_asms = list(self.current_geometry_state.assemblies.values())
-                for asm in all_asms:
-                    for pv in asm.placements:
-                        if pv.id == object_id:
-                            target_obj = pv
-                            break
-                    if target_obj: break
+            # Placements in both logical volumes and assemblies
+            target_obj = self._find_pv_by_id(object_id)
 
         if not target_obj: 
             return False, f"Could not find object of type '{object_type}' with ID/Name '{object_id}'"
@@ -907,9 +1208,10 @@ class ProjectManager:
 
     def add_define(self, name_suggestion, define_type, raw_expression, unit=None, category=None):
         if not self.current_geometry_state: return None, "No project loaded"
-        name = self._generate_unique_name(name_suggestion, self.current_geometry_state.defines)
+        state = self.current_geometry_state
+        name = self._generate_unique_name(name_suggestion, state.defines)
         new_define = Define(name, define_type, raw_expression, unit, category)
-        self.current_geometry_state.add_define(new_define)
+        state.add_define(new_define)
         self.recalculate_geometry_state()
 
         # Capture the new state
@@ -932,18 +1234,19 @@ class ProjectManager:
         if new_category is not None: 
             target_define.category = new_category
 
-        # Capture the new state
-        self._capture_history_state(f"Updated define {define_name}")
+        # Capture the new state (editing a define keeps the recorded dependency info valid)
+        self._capture_history_state_keeping_evaluation(f"Updated define {define_name}")
 
-        success, error_msg = self.recalculate_geometry_state()
+        success, error_msg = self.recalculate_dependents_of(define_name)
         return success, error_msg
 
     def add_material(self, name_suggestion, properties_dict):
         if not self.current_geometry_state: return None, "No project loaded"
-        name = self._generate_unique_name(name_suggestion, self.current_geometry_state.materials)
+        state = self.current_geometry_state
+        name = self._generate_unique_name(name_suggestion, state.materials)
         # Assumes properties_dict contains expression strings like Z_expr, A_expr, density_expr
         new_material = Material(name, **properties_dict)
-        self.current_geometry_state.add_material(new_material)
+        state.add_material(new_material)
         self.recalculate_geometry_state()
 
         # Capture the new state
@@ -961,8 +1264,16 @@ class ProjectManager:
         # if 'Z' in new_properties: target_mat.Z = new_properties['Z']
         # if 'A' in new_properties: target_mat.A = new_properties['A']
         # if 'components' in new_properties: target_mat.components = new_properties['components']
+        unknown = [key for key in new_properties if key not in Material.__slots__]
+        if unknown: return False, f"Unknown material properties: {unknown}"
         for key, value in new_properties.items(): setattr(target_mat, key, value)
         
+        # Only Z/A/density expressions are evaluated; other edits cannot change any value
+        if _EVALUATED_MATERIAL_KEYS.isdisjoint(new_properties):
+            self._capture_history_state_keeping_evaluation(f"Updated material {mat_name}")
+            self._recalculate_if_stale()
+            return True, None
+
         # Capture the new state
         self._capture_history_state(f"Updated material {mat_name}")
 
@@ -973,8 +1284,9 @@ class ProjectManager:
         """Adds a new element to the project."""
         if not self.current_geometry_state:
             return None, "No project loaded"
+        state = self.current_geometry_state
         
-        name = self._generate_unique_name(name_suggestion, self.current_geometry_state.elements)
+        name = self._generate_unique_name(name_suggestion, state.elements)
         
         new_element = Element(
             name=name,
@@ -984,11 +1296,11 @@ class ProjectManager:
             components=params.get('components', [])
         )
         
-        self.current_geometry_state.add_element(new_element)
-        self.recalculate_geometry_state()
+        state.add_element(new_element)
+        self._recalculate_if_stale() # Elements themselves are not evaluated
 
         # Capture the new state
-        self._capture_history_state(f"Added element {name}")
+        self._capture_history_state_keeping_evaluation(f"Added element {name}")
         
         return new_element.to_dict(), None
 
@@ -1001,26 +1313,31 @@ class ProjectManager:
         if not target_element:
             return False, f"Element '{element_name}' not found."
 
-        target_element.formula = new_params.get('formula', target_element.formula)
-        target_element.Z = new_params.get('Z', target_element.Z)
-        target_element.A_expr = new_params.get('A_expr', target_element.A_expr)
-        target_element.components = new_params.get('components', target_element.components)
+        new_values = (new_params.get('formula', target_element.formula),
+                      new_params.get('Z', target_element.Z),
+                      new_params.get('A_expr', target_element.A_expr),
+                      new_params.get('components', target_element.components))
+        if new_values == (target_element.formula, target_element.Z, target_element.A_expr, target_element.components):
+            return True, None # Nothing changed: no history entry
+
+        target_element.formula, target_element.Z, target_element.A_expr, target_element.components = new_values
 
         # Capture the new state
-        self._capture_history_state(f"Updated element {element_name}")
+        self._capture_history_state_keeping_evaluation(f"Updated element {element_name}")
 
-        self.recalculate_geometry_state()
+        self._recalculate_if_stale() # Elements themselves are not evaluated
         return True, None
 
     def add_isotope(self, name_suggestion, params):
         if not self.current_geometry_state: return None, "No project loaded"
-        name = self._generate_unique_name(name_suggestion, self.current_geometry_state.isotopes)
+        state = self.current_geometry_state
+        name = self._generate_unique_name(name_suggestion, state.isotopes)
         new_isotope = Isotope(name, Z=params.get('Z'), N=params.get('N'), A_expr=params.get('A_expr'))
-        self.current_geometry_state.add_isotope(new_isotope)
-        self.recalculate_geometry_state()
+        state.add_isotope(new_isotope)
+        self._recalculate_if_stale() # Isotopes themselves are not evaluated
 
         # Capture the new state
-        self._capture_history_state(f"Added isotope {name}")
+        self._capture_history_state_keeping_evaluation(f"Added isotope {name}")
 
         return new_isotope.to_dict(), None
 
@@ -1028,13 +1345,16 @@ class ProjectManager:
         if not self.current_geometry_state: return False, "No project loaded"
         target_isotope = self.current_geometry_state.isotopes.get(isotope_name)
         if not target_isotope: return False, f"Isotope '{isotope_name}' not found."
-        target_isotope.Z = new_params.get('Z', target_isotope.Z)
-        target_isotope.N = new_params.get('N', target_isotope.N)
-        target_isotope.A_expr = new_params.get('A_expr', target_isotope.A_expr)
-        self.recalculate_geometry_state()
+        new_values = (new_params.get('Z', target_isotope.Z),
+                      new_params.get('N', target_isotope.N),
+                      new_params.get('A_expr', target_isotope.A_expr))
+        if new_values == (target_isotope.Z, target_isotope.N, target_isotope.A_expr):
+            return True, None # Nothing changed: no history entry
+        target_isotope.Z, target_isotope.N, target_isotope.A_expr = new_values
+        self._recalculate_if_stale() # Isotopes themselves are not evaluated
 
         # Capture the new state
-        self._capture_history_state(f"Updated isotope {isotope_name}")
+        self._capture_history_state_keeping_evaluation(f"Updated isotope {isotope_name}")
 
         return True, None
 
@@ -1044,13 +1364,14 @@ class ProjectManager:
         """
         if not self.current_geometry_state:
             return None, "No project loaded"
+        state = self.current_geometry_state
         
         # Start with a clear change tracker
         self._clear_change_tracker()
         
-        name = self._generate_unique_name(name_suggestion, self.current_geometry_state.solids)
+        name = self._generate_unique_name(name_suggestion, state.solids)
         new_solid = Solid(name, solid_type, raw_parameters)
-        self.current_geometry_state.add_solid(new_solid)
+        state.add_solid(new_solid)
 
         # Set the new solid as "changed" so it is sent to the front end for sure
         self.changed_object_ids['solids'].add(name)
@@ -1071,13 +1392,16 @@ class ProjectManager:
             
         if target_solid.type == 'boolean':
             return False, "Boolean solids must be updated via the 'update_boolean_solid' method."
+
+        if new_raw_parameters == target_solid.raw_parameters:
+            return self._recalculate_if_stale() # Nothing changed: no history entry
             
         target_solid.raw_parameters = new_raw_parameters
+        success, error_msg = self.recalculate_solids([target_solid])
 
         # Capture the new state
-        self._capture_history_state(f"Added standard solid {solid_id}")
+        self._capture_history_state_keeping_evaluation(f"Added standard solid {solid_id}")
         
-        success, error_msg = self.recalculate_geometry_state()
         return success, error_msg
 
     def add_boolean_solid(self, name_suggestion, recipe):
@@ -1085,18 +1409,20 @@ class ProjectManager:
         Creates a single 'virtual' boolean solid that stores the recipe.
         """
         if not self.current_geometry_state: return False, "No project loaded."
+        state = self.current_geometry_state
         if len(recipe) < 2 or recipe[0].get('op') != 'base':
             return False, "Invalid recipe format."
 
+        solids = state.solids
         for item in recipe:
             ref = item.get('solid_ref')
-            if not ref or ref not in self.current_geometry_state.solids:
+            if not ref or ref not in solids:
                 return False, f"Solid '{ref}' not found in project."
 
-        name = self._generate_unique_name(name_suggestion, self.current_geometry_state.solids)
+        name = self._generate_unique_name(name_suggestion, solids)
         params = {"recipe": recipe}
         new_solid = Solid(name, "boolean", params)
-        self.current_geometry_state.add_solid(new_solid)
+        state.add_solid(new_solid)
 
         # Capture the new state
         self._capture_history_state(f"Added boolean solid {name}")
@@ -1109,21 +1435,25 @@ class ProjectManager:
         """
         if not self.current_geometry_state: return False, "No project loaded."
         
-        target_solid = self.current_geometry_state.solids.get(solid_name)
+        solids = self.current_geometry_state.solids
+        target_solid = solids.get(solid_name)
         if not target_solid or target_solid.type != 'boolean':
             return False, f"Boolean solid '{solid_name}' not found."
 
         # Validate new recipe
         for item in new_recipe:
             ref = item.get('solid_ref')
-            if not ref or ref not in self.current_geometry_state.solids:
+            if not ref or ref not in solids:
                 return False, f"Solid '{ref}' not found in project."
 
+        if new_recipe == target_solid.raw_parameters.get('recipe'):
+            return self._recalculate_if_stale() # Nothing changed: no history entry
+
         target_solid.raw_parameters['recipe'] = new_recipe
-        self.recalculate_geometry_state()
+        self.recalculate_solids([target_solid])
 
         # Capture the new state
-        self._capture_history_state(f"Updated boolean solid {solid_name}")
+        self._capture_history_state_keeping_evaluation(f"Updated boolean solid {solid_name}")
 
         return True, None
 
@@ -1131,87 +1461,91 @@ class ProjectManager:
         """
         Handles both primitive and boolean solid creation.
         """
-        if not self.current_geometry_state:
-            return False, "No project loaded."
+        # The solid, LV and PV steps each recalculate; run that once for the whole operation
+        with self._deferred_recalculation():
+            if not self.current_geometry_state:
+                return False, "No project loaded."
 
-        solid_name_sugg = solid_params['name']
-        solid_type = solid_params['type']
+            solid_name_sugg = solid_params['name']
+            solid_type = solid_params['type']
         
-        new_solid_dict = None
-        solid_error = None
+            new_solid_dict = None
+            solid_error = None
 
-        # --- 1. Add the Solid (dispatch based on type) ---
-        if solid_type == 'boolean':
-            recipe = solid_params['recipe']
-            new_solid_dict, solid_error = self.add_boolean_solid(solid_name_sugg, recipe)
-        else:
-            solid_raw_params = solid_params['params']
-            new_solid_dict, solid_error = self.add_solid(solid_name_sugg, solid_type, solid_raw_params)
+            # --- 1. Add the Solid (dispatch based on type) ---
+            if solid_type == 'boolean':
+                recipe = solid_params['recipe']
+                new_solid_dict, solid_error = self.add_boolean_solid(solid_name_sugg, recipe)
+            else:
+                solid_raw_params = solid_params['params']
+                new_solid_dict, solid_error = self.add_solid(solid_name_sugg, solid_type, solid_raw_params)
         
-        if solid_error:
-            return False, f"Failed to create solid: {solid_error}"
+            if solid_error:
+                return False, f"Failed to create solid: {solid_error}"
         
-        new_solid_name = new_solid_dict['name']
+            new_solid_name = new_solid_dict['name']
 
-        # --- 2. Add the Logical Volume (if requested) ---
-        if not lv_params:
+            # --- 2. Add the Logical Volume (if requested) ---
+            if not lv_params:
             
-            # Capture the new state
-            self._capture_history_state(f"Added solid {new_solid_name}, no LV or PV")
+                # Capture the new state
+                self._capture_history_state(f"Added solid {new_solid_name}, no LV or PV")
 
-            self.recalculate_geometry_state() # Recalculate just before returning
-            return True, None
+                self.recalculate_geometry_state() # Recalculate just before returning
+                return True, None
             
-        lv_name_sugg = lv_params.get('name', f"{new_solid_name}_lv")
-        material_ref = lv_params.get('material_ref')
+            lv_name_sugg = lv_params.get('name', f"{new_solid_name}_lv")
+            material_ref = lv_params.get('material_ref')
 
-        new_lv_dict, lv_error = self.add_logical_volume(lv_name_sugg, new_solid_name, material_ref)
-        if lv_error:
-            return False, f"Failed to create logical volume: {lv_error}"
+            new_lv_dict, lv_error = self.add_logical_volume(lv_name_sugg, new_solid_name, material_ref)
+            if lv_error:
+                return False, f"Failed to create logical volume: {lv_error}"
             
-        new_lv_name = new_lv_dict['name']
+            new_lv_name = new_lv_dict['name']
 
-        # --- 3. Add the Physical Volume Placement (if requested) ---
-        if not pv_params:
+            # --- 3. Add the Physical Volume Placement (if requested) ---
+            if not pv_params:
 
-            # Capture the new state
-            self._capture_history_state(f"Added solid {new_solid_name} and LV {new_lv_name}, no PV")
+                # Capture the new state
+                self._capture_history_state(f"Added solid {new_solid_name} and LV {new_lv_name}, no PV")
 
-            self.recalculate_geometry_state()
-            return True, None
+                self.recalculate_geometry_state()
+                return True, None
             
-        parent_lv_name = pv_params.get('parent_lv_name')
-        if not parent_lv_name:
-             return False, "Parent logical volume for placement was not specified."
+            parent_lv_name = pv_params.get('parent_lv_name')
+            if not parent_lv_name:
+                 return False, "Parent logical volume for placement was not specified."
         
-        pv_name_sugg = pv_params.get('name', f"{new_lv_name}_PV")
-        position = {'x': '0', 'y': '0', 'z': '0'} 
-        rotation = {'x': '0', 'y': '0', 'z': '0'}
-        scale    = {'x': '1', 'y': '1', 'z': '1'}
+            pv_name_sugg = pv_params.get('name', f"{new_lv_name}_PV")
+            position = {'x': '0', 'y': '0', 'z': '0'} 
+            rotation = {'x': '0', 'y': '0', 'z': '0'}
+            scale    = {'x': '1', 'y': '1', 'z': '1'}
 
-        new_pv_dict, pv_error = self.add_physical_volume(parent_lv_name, pv_name_sugg, new_lv_name, position, rotation, scale)
-        if pv_error:
-            return False, f"Failed to place physical volume: {pv_error}"
+            new_pv_dict, pv_error = self.add_physical_volume(parent_lv_name, pv_name_sugg, new_lv_name, position, rotation, scale)
+            if pv_error:
+                return False, f"Failed to place physical volume: {pv_error}"
         
-        new_pv_name = new_pv_dict['name']
+            new_pv_name = new_pv_dict['name']
         
-        # Capture the new state
-        self._capture_history_state(f"Added solid {new_solid_name}, LV {new_lv_name}, PV {new_pv_name}")
+            # Capture the new state
+            self._capture_history_state(f"Added solid {new_solid_name}, LV {new_lv_name}, PV {new_pv_name}")
         
-        self.recalculate_geometry_state()
-        return True, None
+            self.recalculate_geometry_state()
+            return True, None
 
     def add_logical_volume(self, name_suggestion, solid_ref, material_ref, 
                            vis_attributes=None, is_sensitive=False,
                            content_type='physvol', content=None):
         
         if not self.current_geometry_state: return None, "No project loaded"
-        if solid_ref not in self.current_geometry_state.solids:
+
+        state = self.current_geometry_state
+        if solid_ref not in state.solids:
             return None, f"Solid '{solid_ref}' not found."
-        if material_ref not in self.current_geometry_state.materials:
+        if material_ref not in state.materials:
             return None, f"Material '{material_ref}' not found."
 
-        name = self._generate_unique_name(name_suggestion, self.current_geometry_state.logical_volumes)
+        name = self._generate_unique_name(name_suggestion, state.logical_volumes)
         new_lv = LogicalVolume(name, solid_ref, material_ref, vis_attributes, is_sensitive)
 
         new_lv.content_type = content_type
@@ -1219,10 +1553,9 @@ class ProjectManager:
             new_lv.content = ReplicaVolume.from_dict(content)
         elif content_type == 'division':
             new_lv.content = DivisionVolume.from_dict(content)
-        else: # physvol
-            new_lv.content = [] # It's a new, empty standard LV
+        # physvol: the constructor already gave the new LV an empty content list
 
-        self.current_geometry_state.add_logical_volume(new_lv)
+        state.add_logical_volume(new_lv)
         self.recalculate_geometry_state()
 
         # Capture the new state
@@ -1235,14 +1568,15 @@ class ProjectManager:
                               new_content_type=None, new_content=None):
         if not self.current_geometry_state: return False, "No project loaded"
         
-        lv = self.current_geometry_state.logical_volumes.get(lv_name)
+        state = self.current_geometry_state
+        lv = state.logical_volumes.get(lv_name)
         if not lv:
             return False, f"Logical Volume '{lv_name}' not found."
 
         # Update standard properties if provided
-        if new_solid_ref and new_solid_ref in self.current_geometry_state.solids:
+        if new_solid_ref and new_solid_ref in state.solids:
             lv.solid_ref = new_solid_ref
-        if new_material_ref and new_material_ref in self.current_geometry_state.materials:
+        if new_material_ref and new_material_ref in state.materials:
             lv.material_ref = new_material_ref
         if new_vis_attributes is not None:
             lv.vis_attributes = new_vis_attributes
@@ -1261,7 +1595,10 @@ class ProjectManager:
                 lv.content = ParamVolume.from_dict(new_content)
             else: # physvol
                 # This could be more complex, might need to update existing children
-                lv.content = [] 
+                if isinstance(lv.content, list):
+                    lv.content.clear()
+                else:
+                    lv.content = []
 
         # Capture the new state
         self._capture_history_state(f"Updated LV {lv_name}")
@@ -1280,9 +1617,7 @@ class ProjectManager:
             return None, f"Parent Logical Volume '{parent_lv_name}' not found."
         
         # A placed reference can be either a Logical Volume OR an Assembly.
-        is_lv = placed_lv_ref in state.logical_volumes
-        is_assembly = placed_lv_ref in state.assemblies
-        if not is_lv and not is_assembly:
+        if placed_lv_ref not in state.logical_volumes and placed_lv_ref not in state.assemblies:
             return None, f"Placed Volume or Assembly '{placed_lv_ref}' not found."
 
         # Generate a unique name for this PV *within its parent* (GDML PV names are not global)
@@ -1304,6 +1639,44 @@ class ProjectManager:
         self.recalculate_geometry_state()
         return new_pv.to_dict(), None
 
+    def _placement_parent_errors(self, parent_lv_names, incoming_lvs=None):
+        """
+        Returns an error for every placement parent that is neither a 'physvol' LV of
+        the current state nor of incoming_lvs (LVs about to be merged). Existing LVs
+        take precedence, as they do once the incoming ones are merged.
+        """
+        state = self.current_geometry_state
+        errors = []
+        for parent_lv_name in dict.fromkeys(parent_lv_names):
+            parent_lv = state.logical_volumes.get(parent_lv_name)
+            if parent_lv is None and incoming_lvs:
+                parent_lv = incoming_lvs.get(parent_lv_name)
+            if not parent_lv:
+                errors.append(f"Parent logical volume '{parent_lv_name}' not found for placement.")
+            elif parent_lv.content_type != 'physvol':
+                errors.append(f"Cannot add a physical volume to '{parent_lv_name}' because it is procedurally defined as a '{parent_lv.content_type}'.")
+        return errors
+
+    def _append_placements(self, placements):
+        """
+        Appends PhysicalVolumePlacement objects to their parent LVs (given by parent_lv_name),
+        extending each parent's content list once. Every parent is checked first and
+        nothing is appended if any of them is missing or procedural.
+        Returns the list of error messages.
+        """
+        by_parent = {}
+        for pv in placements:
+            by_parent.setdefault(pv.parent_lv_name, []).append(pv)
+
+        errors = self._placement_parent_errors(by_parent)
+        if errors:
+            return errors
+
+        logical_volumes = self.current_geometry_state.logical_volumes
+        for parent_lv_name, children in by_parent.items():
+            logical_volumes[parent_lv_name].content.extend(children)
+        return errors
+
     def update_physical_volume(self, pv_id, new_name, new_position, new_rotation, new_scale):
         if not self.current_geometry_state: return False, "No project loaded"
         
@@ -1320,29 +1693,8 @@ class ProjectManager:
         return self.update_physical_volume_batch(update)
     
     def _update_single_pv(self, pv_id, new_name, new_position, new_rotation, new_scale):
-        pv_to_update = None
-
-        # Search through all logical volumes and their new 'content' list
-        all_lvs = list(self.current_geometry_state.logical_volumes.values())
-        for lv in all_lvs:
-            if lv.content_type == 'physvol':
-                for pv in lv.content:
-                    if pv.id == pv_id:
-                        pv_to_update = pv
-                        break
-            if pv_to_update:
-                break
-        
-        # Also search assemblies
-        if not pv_to_update:
-            all_asms = list(self.current_geometry_state.assemblies.values())
-            for asm in all_asms:
-                for pv in asm.placements:
-                    if pv.id == pv_id:
-                        pv_to_update = pv
-                        break
-                if pv_to_update:
-                    break
+        # Search through all logical volumes and assemblies
+        pv_to_update = self._find_pv_by_id(pv_id)
         
         if not pv_to_update:
             return None
@@ -1361,6 +1713,7 @@ class ProjectManager:
         """
         if not self.current_geometry_state:
             return False, "No project loaded."
+        state = self.current_geometry_state
         
         updated_pv_objects = []
         
@@ -1378,8 +1731,8 @@ class ProjectManager:
                 updated_pv = self._update_single_pv(pv_id, new_name, new_position, new_rotation, new_scale)
                 updated_pv_objects.append(updated_pv)
                 
-            # After all updates are applied, recalculate the entire state
-            success, error_msg = self.recalculate_geometry_state()
+            # After all updates are applied, re-evaluate the edited placements
+            success, error_msg = self.recalculate_placements([pv for pv in updated_pv_objects if pv is not None])
             if not success:
                 return False, error_msg
 
@@ -1388,7 +1741,7 @@ class ProjectManager:
             # To ensure consistency, we update ALL bound sources.
             # This is computationally cheap enough (usually < 100 sources) and guarantees correctness without complex tree traversal checks.
             sources_updated = []
-            for source in self.current_geometry_state.sources.values():
+            for source in state.sources.values():
                 if source.volume_link_id:
                     pv = self._find_pv_by_id(source.volume_link_id)
                     if pv:
@@ -1406,9 +1759,9 @@ class ProjectManager:
                         }
                         
                         # 2. Update Shape Parameters
-                        lv = self.current_geometry_state.logical_volumes.get(pv.volume_ref)
+                        lv = state.logical_volumes.get(pv.volume_ref)
                         if lv:
-                            solid = self.current_geometry_state.solids.get(lv.solid_ref)
+                            solid = state.solids.get(lv.solid_ref)
                             if solid:
                                 p = solid._evaluated_parameters
                                 cmds = source.gps_commands
@@ -1466,21 +1819,22 @@ class ProjectManager:
         }
         
         # If everything succeeded, capture the final state and return
-        self._capture_history_state(f"Batch update to {len(updated_pv_objects)} PVs")
+        self._capture_history_state_keeping_evaluation(f"Batch update to {len(updated_pv_objects)} PVs")
         return True, project_state_patch
 
     def add_assembly(self, name_suggestion, placements_data):
         if not self.current_geometry_state:
             return None, "No project loaded"
+        state = self.current_geometry_state
         
-        name = self._generate_unique_name(name_suggestion, self.current_geometry_state.assemblies)
+        name = self._generate_unique_name(name_suggestion, state.assemblies)
         new_assembly = Assembly(name)
         
         # Convert placement dicts into PhysicalVolumePlacement objects
         placements = [PhysicalVolumePlacement.from_dict(p_data) for p_data in placements_data]
         new_assembly.placements = placements
         
-        self.current_geometry_state.add_assembly(new_assembly)
+        state.add_assembly(new_assembly)
         self.recalculate_geometry_state()
 
         # Capture the new state
@@ -1510,13 +1864,14 @@ class ProjectManager:
     def add_particle_source(self, name_suggestion, gps_commands, position, rotation, activity=1.0, confine_to_pv=None):
         if not self.current_geometry_state:
             return None, "No project loaded"
+        state = self.current_geometry_state
 
         if confine_to_pv == "":
             confine_to_pv = None
 
-        name = self._generate_unique_name(name_suggestion, self.current_geometry_state.sources)
+        name = self._generate_unique_name(name_suggestion, state.sources)
         new_source = ParticleSource(name, gps_commands, position, rotation, activity=activity, confine_to_pv=confine_to_pv)
-        self.current_geometry_state.add_source(new_source)
+        state.add_source(new_source)
         self.recalculate_geometry_state()
         self._capture_history_state(f"Added particle source {name}")
         return new_source.to_dict(), None
@@ -1554,9 +1909,10 @@ class ProjectManager:
         """
         if not self.current_geometry_state:
             return False, "No project loaded."
+        state = self.current_geometry_state
         
         # --- Do not allow deletion of world PV or LV ---
-        world_lv = self.current_geometry_state.logical_volumes[self.current_geometry_state.world_volume_ref]
+        world_lv = state.logical_volumes[state.world_volume_ref]
         for item in objects_to_delete:
 
             print(f"Deleting item {item} for world LV {world_lv}")
@@ -1670,6 +2026,8 @@ class ProjectManager:
         This function ASSUMES all dependency checks have already passed.
         """
         state = self.current_geometry_state
+        if object_type != "physical_volume":
+            self._pv_index = None # Removing an LV or assembly drops its placements from the index
         deleted = False
         error_msg = None
 
@@ -1729,8 +2087,10 @@ class ProjectManager:
                     # Now, remove any placements that REFER to this deleted LV
                     for lv in state.logical_volumes.values():
                         if lv.content_type == 'physvol':
-                            lv.content = [pv for pv in lv.content if pv.volume_ref != object_id]
-                        elif lv.content and hasattr(lv.content, 'volume_ref') and lv.content.volume_ref == object_id:
+                            # Only rebuild content lists that actually place the deleted LV
+                            if any(pv.volume_ref == object_id for pv in lv.content):
+                                lv.content = [pv for pv in lv.content if pv.volume_ref != object_id]
+                        elif lv.content_type in _PROCEDURAL_CONTENT_TYPES and getattr(lv.content, 'volume_ref', None) == object_id:
                             # If a procedural volume was replicating the deleted LV, reset it.
                             # A more advanced implementation might delete the procedural LV entirely.
                             lv.content_type = 'physvol'
@@ -1738,19 +2098,17 @@ class ProjectManager:
                     deleted = True
         
         elif object_type == "physical_volume":
-            # Iterate through all LVs and check their 'content' list for the PV to delete
+            # Look up the LV whose 'content' list holds the PV to delete
             found_and_deleted = False
-            for lv in state.logical_volumes.values():
-                if lv.content_type == 'physvol':
-                    original_len = len(lv.content)
-                    # Filter the list, keeping only PVs that DON'T match the ID
-                    lv.content = [pv for pv in lv.content if pv.id != object_id]
-                    if len(lv.content) < original_len:
-                        found_and_deleted = True
-                        break # Found and deleted, no need to search further
+            lv, pv = self._find_pv_container(object_id)
+            if isinstance(lv, LogicalVolume) and lv.content_type == 'physvol' and pv in lv.content:
+                # Remove in place rather than rebuilding the list
+                lv.content.remove(pv)
+                found_and_deleted = True
             
             if found_and_deleted:
                 deleted = True
+                self._pv_index.pop(object_id, None)
                 # Clean up any sources that were linked to this PV
                 for source in state.sources.values():
                     if source.volume_link_id == object_id:
@@ -1849,8 +2207,8 @@ class ProjectManager:
                                 break
 
             # --- 3. Check for usage in all Placements (Standard, Assembly, Procedural) ---
-            all_lvs = list(state.logical_volumes.values())
-            all_asms = list(state.assemblies.values())
+            all_lvs = state.logical_volumes.values()
+            all_asms = state.assemblies.values()
             
             # Standard LV placements
             for lv in all_lvs:
@@ -1869,7 +2227,7 @@ class ProjectManager:
 
             # --- 4. Check for usage in Procedural Volume parameters ---
             for lv in all_lvs:
-                if lv.content_type in ['replica', 'division', 'parameterised']:
+                if lv.content_type in _PROCEDURAL_CONTENT_TYPES:
                     proc_obj = lv.content
                     # Check number/ncopies, width, offset
                     for attr in ['number', 'width', 'offset', 'ncopies']:
@@ -1938,57 +2296,84 @@ class ProjectManager:
             self.current_geometry_state = incoming_state
             # Even if it's a fresh state, it might have placements to add
             if hasattr(incoming_state, 'placements_to_add'):
+                # Group by parent so each parent's content list is extended once
+                by_parent = {}
                 for pv_to_add in incoming_state.placements_to_add:
-                    parent_lv = self.current_geometry_state.logical_volumes.get(pv_to_add.parent_lv_name)
+                    by_parent.setdefault(pv_to_add.parent_lv_name, []).append(pv_to_add)
+                for parent_lv_name, children in by_parent.items():
+                    parent_lv = incoming_state.logical_volumes.get(parent_lv_name)
                     if parent_lv:
-                        parent_lv.add_child(pv_to_add)
+                        # Same as add_child: placements are only kept by 'physvol' LVs
+                        if parent_lv.content_type == 'physvol':
+                            parent_lv.content.extend(children)
                     else:
-                        print(f"Warning: Could not find parent LV '{pv_to_add.parent_lv_name}' for initial placement.")
+                        for pv_to_add in children:
+                            print(f"Warning: Could not find parent LV '{pv_to_add.parent_lv_name}' for initial placement.")
             return True, None
 
+        state = self.current_geometry_state
         rename_map = {} # Tracks old_name -> new_name
+        rename = rename_map.get # Single-probe lookup: rename(ref, ref)
+        gen = self._generate_unique_name
 
         # --- Merge Defines ---
-        for name, define in incoming_state.defines.items():
-            new_name = self._generate_unique_name(name, self.current_geometry_state.defines)
-            if new_name != name:
-                rename_map[name] = new_name
-            define.name = new_name
-            self.current_geometry_state.add_define(define)
+        if incoming_state.defines.keys().isdisjoint(state.defines):
+            # No name clashes: nothing can be renamed, so merge in bulk (names follow the keys)
+            for name, define in incoming_state.defines.items():
+                define.name = name
+            state.defines.update(incoming_state.defines)
+        else:
+            for name, define in incoming_state.defines.items():
+                # An identical define of the same name is reused rather than duplicated
+                existing = state.defines.get(name)
+                if existing is not None and self._define_signature(existing) == self._define_signature(define):
+                    continue
+                new_name = gen(name, state.defines)
+                if new_name != name:
+                    rename_map[name] = new_name
+                define.name = new_name
+                state.add_define(define)
 
         # --- Merge Materials ---
-        for name, material in incoming_state.materials.items():
-            # Update component references if their names were changed
-            if material.components:
-                for comp in material.components:
-                    if comp['ref'] in rename_map:
-                        comp['ref'] = rename_map[comp['ref']]
+        if not rename_map and incoming_state.materials.keys().isdisjoint(state.materials):
+            for name, material in incoming_state.materials.items():
+                material.name = name
+            state.materials.update(incoming_state.materials)
+        else:
+            for name, material in incoming_state.materials.items():
+                # Update component references if their names were changed
+                if rename_map and material.components:
+                    for comp in material.components:
+                        comp['ref'] = rename(comp['ref'], comp['ref'])
             
-            new_name = self._generate_unique_name(name, self.current_geometry_state.materials)
-            if new_name != name:
-                rename_map[name] = new_name
-            material.name = new_name
-            self.current_geometry_state.add_material(material)
+                new_name = gen(name, state.materials)
+                if new_name != name:
+                    rename_map[name] = new_name
+                material.name = new_name
+                state.add_material(material)
 
         # --- Merge Solids ---
-        for name, solid in incoming_state.solids.items():
-            # Update solid references within booleans
-            if solid.type in ['boolean', 'union', 'subtraction', 'intersection']:
-                if solid.type == 'boolean': # New virtual boolean
-                    for item in solid.raw_parameters.get('recipe', []):
-                        if item['solid_ref'] in rename_map:
-                            item['solid_ref'] = rename_map[item['solid_ref']]
-                else: # Old style boolean
-                    if solid.raw_parameters['first_ref'] in rename_map:
-                        solid.raw_parameters['first_ref'] = rename_map[solid.raw_parameters['first_ref']]
-                    if solid.raw_parameters['second_ref'] in rename_map:
-                        solid.raw_parameters['second_ref'] = rename_map[solid.raw_parameters['second_ref']]
-
-            new_name = self._generate_unique_name(name, self.current_geometry_state.solids)
-            if new_name != name:
-                rename_map[name] = new_name
-            solid.name = new_name
-            self.current_geometry_state.add_solid(solid)
+        if not rename_map and incoming_state.solids.keys().isdisjoint(state.solids):
+            for name, solid in incoming_state.solids.items():
+                solid.name = name
+            state.solids.update(incoming_state.solids)
+        else:
+            for name, solid in incoming_state.solids.items():
+                # Update solid references within booleans
+                if rename_map and solid.type in ['boolean', 'union', 'subtraction', 'intersection']:
+                    if solid.type == 'boolean': # New virtual boolean
+                        for item in solid.raw_parameters.get('recipe', []):
+                            item['solid_ref'] = rename(item['solid_ref'], item['solid_ref'])
+                    else: # Old style boolean
+                        params = solid.raw_parameters
+                        params['first_ref'] = rename(params['first_ref'], params['first_ref'])
+                        params['second_ref'] = rename(params['second_ref'], params['second_ref'])
+
+                new_name = gen(name, state.solids)
+                if new_name != name:
+                    rename_map[name] = new_name
+                solid.name = new_name
+                state.add_solid(solid)
 
         # --- Merge Logical Volumes ---
         processed_lvs = []
@@ -1997,7 +2382,7 @@ class ProjectManager:
             # Ignore the incoming world volume BUT capture its placements
             if name == incoming_state.world_volume_ref:
                 # Map old world to current world so children can find their new parent
-                rename_map[name] = self.current_geometry_state.world_volume_ref
+                rename_map[name] = state.world_volume_ref
                 
                 # Extract content to be added as placements
                 if lv.content_type == 'physvol' and isinstance(lv.content, list):
@@ -2005,106 +2390,109 @@ class ProjectManager:
                          # Clone via serialization to be safe
                          pv_clone = PhysicalVolumePlacement.from_dict(pv.to_dict())
                          # Explicitly re-parent them to the current world volume
-                         pv_clone.parent_lv_name = self.current_geometry_state.world_volume_ref
+                         pv_clone.parent_lv_name = state.world_volume_ref
                          extra_placements.append(pv_clone)
                 continue
 
             # Update references within this LV
-            if lv.solid_ref in rename_map: lv.solid_ref = rename_map[lv.solid_ref]
-            if lv.material_ref in rename_map: lv.material_ref = rename_map[lv.material_ref]
+            if rename_map:
+                lv.solid_ref = rename(lv.solid_ref, lv.solid_ref)
+                lv.material_ref = rename(lv.material_ref, lv.material_ref)
             
             # Note: We are preserving internal placements (sub-assemblies).
             # We will fix up their references in a second pass.
 
-            new_name = self._generate_unique_name(name, self.current_geometry_state.logical_volumes)
+            new_name = gen(name, state.logical_volumes)
             if new_name != name:
                 rename_map[name] = new_name
             lv.name = new_name
             
-            self.current_geometry_state.add_logical_volume(lv)
+            state.add_logical_volume(lv)
             processed_lvs.append(lv)
 
         # --- Post-Process LV Content (Fix references in children) ---
         for lv in processed_lvs:
             if lv.content_type == 'physvol' and isinstance(lv.content, list):
                 for pv in lv.content:
-                    # Update reference to the child volume (if it was renamed)
-                    if pv.volume_ref in rename_map:
-                        pv.volume_ref = rename_map[pv.volume_ref]
-                    
                     # Update reference to the parent volume (this LV, which might have been renamed)
                     pv.parent_lv_name = lv.name 
+
+                    if not rename_map:
+                        continue
+
+                    # Update reference to the child volume (if it was renamed)
+                    pv.volume_ref = rename(pv.volume_ref, pv.volume_ref)
                     
                     # Update defines in positioning
-                    if isinstance(pv.position, str) and pv.position in rename_map:
-                         pv.position = rename_map[pv.position]
-                    if isinstance(pv.rotation, str) and pv.rotation in rename_map:
-                         pv.rotation = rename_map[pv.rotation]
+                    if isinstance(pv.position, str):
+                        pv.position = rename(pv.position, pv.position)
+                    if isinstance(pv.rotation, str):
+                        pv.rotation = rename(pv.rotation, pv.rotation)
         
         # --- Merge Assemblies ---
         for name, assembly in incoming_state.assemblies.items():
             # Update all references within the assembly's placements
-            for pv in assembly.placements:
-                if pv.volume_ref in rename_map:
-                    pv.volume_ref = rename_map[pv.volume_ref]
-                if isinstance(pv.position, str) and pv.position in rename_map:
-                    pv.position = rename_map[pv.position]
-                if isinstance(pv.rotation, str) and pv.rotation in rename_map:
-                    pv.rotation = rename_map[pv.rotation]
+            if rename_map:
+                for pv in assembly.placements:
+                    pv.volume_ref = rename(pv.volume_ref, pv.volume_ref)
+                    if isinstance(pv.position, str):
+                        pv.position = rename(pv.position, pv.position)
+                    if isinstance(pv.rotation, str):
+                        pv.rotation = rename(pv.rotation, pv.rotation)
             
-            new_name = self._generate_unique_name(name, self.current_geometry_state.assemblies)
+            new_name = gen(name, state.assemblies)
             if new_name != name:
                 rename_map[name] = new_name
             assembly.name = new_name
-            self.current_geometry_state.add_assembly(assembly)
+            state.add_assembly(assembly)
 
         # --- Merge Sources ---
         for name, source in incoming_state.sources.items():
             old_id = source.id
             
             # Generate new unique name
-            new_name = self._generate_unique_name(name, self.current_geometry_state.sources)
+            new_name = gen(name, state.sources)
             if new_name != name:
                 rename_map[name] = new_name
             source.name = new_name
             
             # Generate new ID to avoid collisions (especially on re-import)
-            import uuid
             new_id = str(uuid.uuid4())
             source.id = new_id
             
-            self.current_geometry_state.add_source(source)
+            state.add_source(source)
             
             # If this source was active in the incoming state, activate it in the current state
             if old_id in incoming_state.active_source_ids:
-                self.current_geometry_state.active_source_ids.append(new_id)
+                state.active_source_ids.append(new_id)
 
         # --- Process and Add Placements ---
         # Combine explicitly requested placements with those extracted from the incoming world
         all_placements_to_add = (getattr(incoming_state, 'placements_to_add', []) or []) + extra_placements
         
         if all_placements_to_add:
+            # Child names per parent LV, built once per parent and kept up to date
+            # as placements are added, instead of rescanning content every time
+            child_names = {}
             for pv_to_add in all_placements_to_add:
                 # 1. Update any renamed references within the placement object
-                if pv_to_add.parent_lv_name in rename_map:
-                    pv_to_add.parent_lv_name = rename_map[pv_to_add.parent_lv_name]
-                
-                if pv_to_add.volume_ref in rename_map:
-                    pv_to_add.volume_ref = rename_map[pv_to_add.volume_ref]
-                
-                if isinstance(pv_to_add.position, str) and pv_to_add.position in rename_map:
-                    pv_to_add.position = rename_map[pv_to_add.position]
-                
-                if isinstance(pv_to_add.rotation, str) and pv_to_add.rotation in rename_map:
-                    pv_to_add.rotation = rename_map[pv_to_add.rotation]
+                if rename_map:
+                    pv_to_add.parent_lv_name = rename(pv_to_add.parent_lv_name, pv_to_add.parent_lv_name)
+                    pv_to_add.volume_ref = rename(pv_to_add.volume_ref, pv_to_add.volume_ref)
+                    if isinstance(pv_to_add.position, str):
+                        pv_to_add.position = rename(pv_to_add.position, pv_to_add.position)
+                    if isinstance(pv_to_add.rotation, str):
+                        pv_to_add.rotation = rename(pv_to_add.rotation, pv_to_add.rotation)
 
                 # 2. Find the parent LV in the *main* project state
-                parent_lv = self.current_geometry_state.logical_volumes.get(pv_to_add.parent_lv_name)
+                parent_lv = state.logical_volumes.get(pv_to_add.parent_lv_name)
 
                 if parent_lv:
                     if parent_lv.content_type == 'physvol':
                         # Generate a unique name for the placement within its new parent
-                        existing_names = {pv.name for pv in parent_lv.content}
+                        existing_names = child_names.get(parent_lv.name)
+                        if existing_names is None:
+                            existing_names = child_names[parent_lv.name] = {pv.name for pv in parent_lv.content}
                         base_name = pv_to_add.name
                         i = 1
                         while pv_to_add.name in existing_names:
@@ -2112,6 +2500,7 @@ class ProjectManager:
                             i += 1
 
                         parent_lv.add_child(pv_to_add)
+                        existing_names.add(pv_to_add.name)
                     else:
                         print(f"Warning: Cannot add placement '{pv_to_add.name}'. Parent LV '{parent_lv.name}' is procedural.")
                 else:
@@ -2144,7 +2533,7 @@ class ProjectManager:
 
         # RE-SYNC ALL BOUND SOURCES (Crucial for imported parts)
         # Imported bound sources may have outdated shape parameters or positions relative to the new World.
-        for source in self.current_geometry_state.sources.values():
+        for source in state.sources.values():
             if source.volume_link_id:
                 pv = self._find_pv_by_id(source.volume_link_id)
                 if pv:
@@ -2159,9 +2548,9 @@ class ProjectManager:
                     }
                     
                     # 2. Update Shape Parameters
-                    lv = self.current_geometry_state.logical_volumes.get(pv.volume_ref)
+                    lv = state.logical_volumes.get(pv.volume_ref)
                     if lv:
-                        solid = self.current_geometry_state.solids.get(lv.solid_ref)
+                        solid = state.solids.get(lv.solid_ref)
                         if solid:
                             p = solid._evaluated_parameters
                             cmds = source.gps_commands
@@ -2195,6 +2584,17 @@ class ProjectManager:
 
         return success, error_msg
 
+    @staticmethod
+    def _define_signature(define):
+        """Returns a hashable (type, expression, unit) key identifying a define's content."""
+        def freeze(value):
+            if isinstance(value, dict):
+                return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+            if isinstance(value, list):
+                return tuple(freeze(v) for v in value)
+            return str(value)
+        return (define.type, freeze(define.raw_expression), define.unit)
+
     def _evaluate_vector_expression(self, expr_data, default_dict=None):
         """
         Evaluates a vector-like expression which can be a define reference (string)
@@ -2370,21 +2770,14 @@ class ProjectManager:
         # *** Recursively convert all rotation dictionaries ***
         self._recursively_convert_rotations(ai_data)
 
-        # --- 1. Handle the 'creates' block ---
-        # This block defines new, standalone items. We can merge them all at once.
-        creation_data = ai_data.get("creates", {})
-        if creation_data:
-            temp_state = GeometryState.from_dict(creation_data)
-            success, error_msg = self.merge_from_state(temp_state)
-            if not success:
-                return False, f"Failed to merge AI-defined objects: {error_msg}"
-        
-        # --- 2. Handle the 'updates' block ---
-        # This block modifies existing objects, like placing volumes inside another.
+        # --- Validate the whole response before touching the project ---
+        # Everything that can be checked without the merged state is checked
+        # here, so a malformed response is rejected without a partial apply.
         updates = ai_data.get("updates", [])
         if not isinstance(updates, list):
             return False, "AI response had an invalid 'updates' format (must be a list)."
 
+        new_placements = []
         for update_task in updates:
             try:
                 obj_type = update_task['object_type']
@@ -2393,16 +2786,10 @@ class ProjectManager:
                 data = update_task['data']
 
                 if obj_type == "logical_volume" and action == "append_physvol":
-                    parent_lv = self.current_geometry_state.logical_volumes.get(obj_name)
-                    if not parent_lv:
-                        return False, f"Parent logical volume '{obj_name}' not found for placement."
-                    
-                    if parent_lv.content_type != 'physvol':
-                         return False, f"Cannot add a physical volume to '{obj_name}' because it is procedurally defined as a '{parent_lv.content_type}'."
-
                     # The 'data' dictionary is a complete PhysicalVolumePlacement dictionary
                     new_pv = PhysicalVolumePlacement.from_dict(data)
-                    parent_lv.add_child(new_pv)
+                    new_pv.parent_lv_name = obj_name
+                    new_placements.append(new_pv)
 
                 else:
                     # Placeholder for future actions like "update_property", "delete_item", etc.
@@ -2413,28 +2800,42 @@ class ProjectManager:
             except Exception as e:
                 return False, f"An error occurred during AI update processing: {e}"
 
-        # --- Handle tool calls ---
         tool_calls = ai_data.get("tool_calls", [])
         if not isinstance(tool_calls, list):
             return False, "AI response 'tool_calls' must be a list."
 
-        for call in tool_calls:
-            tool_name = call.get("tool_name")
-            arguments = call.get("arguments", {})
+        unknown_tools = [call.get("tool_name") for call in tool_calls
+                         if call.get("tool_name") != "create_detector_ring"]
+        if unknown_tools:
+            return False, "; ".join(f"Unknown tool requested by AI: '{name}'" for name in unknown_tools)
+
+        creation_data = ai_data.get("creates", {})
+        incoming_state = GeometryState.from_dict(creation_data) if creation_data else None
+
+        # Placement parents may be created by this response, so they are checked
+        # against both the project and the incoming LVs
+        incoming_lvs = incoming_state.logical_volumes if incoming_state else {}
+        placement_errors = self._placement_parent_errors(
+            [pv.parent_lv_name for pv in new_placements], incoming_lvs)
+        if placement_errors:
+            return False, "; ".join(placement_errors)
+
+        # The merge's recalculation and the tool calls can still fail after the project
+        # has changed. The current history entry is already a copy of the project as
+        # it is now, so it is restored on failure instead of copying the project up front.
+        if self.history_index >= 0 and not self._is_transaction_open:
+            checkpoint = self.history[self.history_index]
+        else:
+            checkpoint = GeometryState.from_dict(self.current_geometry_state.to_dict())
+        history, history_index, is_changed = list(self.history), self.history_index, self.is_changed
+
+        success, error_msg = self._apply_ai_response(incoming_state, new_placements, tool_calls)
+        if not success:
+            self.current_geometry_state = GeometryState.from_dict(checkpoint.to_dict())
+            self.history, self.history_index, self.is_changed = history, history_index, is_changed
+            self.recalculate_geometry_state()
+            return False, error_msg
 
-            if tool_name == "create_detector_ring":
-                try:
-                    # The **arguments syntax unpacks the dictionary into keyword arguments
-                    _, error_msg = self.create_detector_ring(**arguments)
-                    if error_msg:
-                        return False, f"Error executing tool '{tool_name}': {error_msg}"
-                except TypeError as e:
-                    return False, f"Mismatched arguments for tool '{tool_name}': {e}"
-                except Exception as e:
-                    return False, f"An unexpected error occurred during tool execution: {e}"
-            else:
-                return False, f"Unknown tool requested by AI: '{tool_name}'"
-            
         # --- 3. Recalculate everything once at the end ---
         success, error_msg = self.recalculate_geometry_state()
 
@@ -2443,14 +2844,49 @@ class ProjectManager:
 
         return success, error_msg
     
+    def _apply_ai_response(self, incoming_state, new_placements, tool_calls):
+        """
+        Applies the validated parts of an AI response to the current state.
+        Returns (success, error_msg); on failure the state may be partially changed.
+        """
+        # --- 1. Handle the 'creates' block ---
+        # This block defines new, standalone items. We can merge them all at once.
+        if incoming_state is not None:
+            success, error_msg = self.merge_from_state(incoming_state)
+            if not success:
+                return False, f"Failed to merge AI-defined objects: {error_msg}"
+
+        # --- 2. Handle the 'updates' block ---
+        # Parents may have been created by the merge above, so they are resolved now
+        if new_placements:
+            placement_errors = self._append_placements(new_placements)
+            if placement_errors:
+                return False, "; ".join(placement_errors)
+
+        # --- Handle tool calls ---
+        for call in tool_calls:
+            tool_name = call.get("tool_name")
+            arguments = call.get("arguments", {})
+
+            try:
+                # The **arguments syntax unpacks the dictionary into keyword arguments
+                _, error_msg = self.create_detector_ring(**arguments)
+                if error_msg:
+                    return False, f"Error executing tool '{tool_name}': {error_msg}"
+            except TypeError as e:
+                return False, f"Mismatched arguments for tool '{tool_name}': {e}"
+            except Exception as e:
+                return False, f"An unexpected error occurred during tool execution: {e}"
+
+        return True, None
+
     def _convert_ai_rotation_to_g4(self, rotation_dict):
         """
         Converts a standard intrinsic ZYX Euler rotation dictionary from the AI
         to the Geant4 extrinsic XYZ Euler rotation with negation.
         Geant4 extrinsic XYZ is equivalent to intrinsic ZYX with negated angles.
         """
-        print(f"CONVERTING rotation",rotation_dict)
-        if not isinstance(rotation_dict, dict):
+        if type(rotation_dict) is not dict:
             # This is likely a reference to a <define>, leave it as is.
             return rotation_dict
 
@@ -2461,7 +2897,7 @@ class ProjectManager:
         for axis in ['x', 'y', 'z']:
             original_expr = rotation_dict.get(axis, '0').strip()
             # If the expression is just '0' or '0.0', no need to wrap it
-            if original_expr in ['0', '0.0']:
+            if original_expr in _ZERO_LITERALS:
                 converted_rotation[axis] = "0"
             else:
                 # Wrap the original expression in parentheses and prepend a minus sign
@@ -2469,30 +2905,67 @@ class ProjectManager:
         return converted_rotation
     
     def _recursively_convert_rotations(self, data):
-        """Recursively traverses a dictionary or list to find and convert 'rotation' dictionaries."""
-        if isinstance(data, dict):
+        """Finds every 'rotation' dictionary in the AI data and converts them in one batch."""
+        gathered = []
+        self._gather_ai_rotations(data, gathered)
+        convert = self._convert_ai_rotation_to_g4
+        for container, rotation in gathered:
+            container['rotation'] = convert(rotation)
+
+    def _gather_ai_rotations(self, data, gathered):
+        """Collects (container, rotation) pairs for all dict-valued 'rotation' keys."""
+        data_type = type(data)
+        if data_type is dict:
             for key, value in data.items():
-                if key == 'rotation' and value is not None:
-                    data[key] = self._convert_ai_rotation_to_g4(value)
+                if key == 'rotation':
+                    if type(value) is dict:
+                        gathered.append((data, value))
                 else:
-                    self._recursively_convert_rotations(value)
-        elif isinstance(data, list):
+                    self._gather_ai_rotations(value, gathered)
+        elif data_type is list:
             for item in data:
-                self._recursively_convert_rotations(item)
+                self._gather_ai_rotations(item, gathered)
 
     def import_step_with_options(self, step_file_stream, options):
         """
         Processes an uploaded STEP file using options, imports the geometry,
         and merges it into the current project.
         """
-        # Save the stream to a temporary file to be read by the STEP parser
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".step") as temp_f:
-            step_file_stream.save(temp_f.name)
-            temp_path = temp_f.name
-        
+        # The upload is hashed so that re-importing the same part can skip the CAD kernel.
+        # The STEP reader only accepts a file path, so the upload still has to go to disk on
+        # a cache miss; a seekable upload is hashed first so that a cache hit writes nothing.
+        hasher = hashlib.sha256()
+        temp_path = None
+        if step_file_stream.seekable():
+            start_pos = step_file_stream.tell()
+            while (chunk := step_file_stream.read(STEP_READ_CHUNK_SIZE)):
+                hasher.update(chunk)
+        else:
+            temp_path = self._write_step_upload(step_file_stream, hasher)
+        hasher.update(json.dumps(options, sort_keys=True).encode())
+        cache_key = hasher.hexdigest()
+
         try:
-            # The STEP parser now takes the options dictionary
-            imported_state = parse_step_file(temp_path, options)
+            cached_state = self._step_cache.get(cache_key)
+            if cached_state is not None:
+                self._step_cache.move_to_end(cache_key)
+                imported_state = copy.deepcopy(cached_state)
+                self._assign_fresh_ids(imported_state)
+            else:
+                if temp_path is None:
+                    step_file_stream.seek(start_pos)
+                    temp_path = self._write_step_upload(step_file_stream)
+
+                # Imported here so pythonocc is only loaded once a STEP file is actually imported
+                from .step_parser import parse_step_file
+
+                # The STEP parser now takes the options dictionary
+                imported_state = parse_step_file(temp_path, options)
+
+                # Keep a pristine copy, since the merge below renames objects in place
+                self._step_cache[cache_key] = copy.deepcopy(imported_state)
+                if len(self._step_cache) > STEP_CACHE_SIZE:
+                    self._step_cache.popitem(last=False)
 
             # Set the new solids as "changed" so they will be sent to the front end
             newly_created_solid_names = set(imported_state.solids.keys())
@@ -2518,23 +2991,65 @@ class ProjectManager:
             raise e
         finally:
             # Clean up the temporary file
-            os.unlink(temp_path)
+            if temp_path:
+                os.unlink(temp_path)
+
+    def _write_step_upload(self, step_file_stream, hasher=None):
+        """Streams an uploaded STEP file to a temporary file and returns its path."""
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".step") as temp_f:
+            while (chunk := step_file_stream.read(STEP_READ_CHUNK_SIZE)):
+                if hasher:
+                    hasher.update(chunk)
+                temp_f.write(chunk)
+        return temp_f.name
+
+    def _assign_fresh_ids(self, state):
+        """Gives every object in a (copied) state a new UUID so it can be merged again."""
+        for collection in (state.defines, state.materials, state.solids, state.assemblies):
+            for obj in collection.values():
+                obj.id = str(uuid.uuid4())
+        for lv in state.logical_volumes.values():
+            lv.id = str(uuid.uuid4())
+            if lv.content_type == 'physvol':
+                for pv in lv.content:
+                    pv.id = str(uuid.uuid4())
+        for asm in state.assemblies.values():
+            for pv in asm.placements:
+                pv.id = str(uuid.uuid4())
+        for pv in getattr(state, 'placements_to_add', []):
+            pv.id = str(uuid.uuid4())
+
+    def _groups_by_name(self, group_type):
+        """
+        Returns the name -> group dict index for one ui_groups list of the current state.
+        The index is rebuilt when the list is replaced (load, undo/redo) or changed in size
+        outside the group methods below, which keep it in sync themselves.
+        """
+        groups = self.current_geometry_state.ui_groups[group_type]
+        entry = self._group_index.get(group_type)
+        if entry is None or entry[0] is not groups or len(entry[1]) != len(groups):
+            entry = self._group_index[group_type] = (groups, {g['name']: g for g in groups})
+        return entry[1]
 
     def create_group(self, group_type, group_name):
         """Creates a new, empty group for a specific object type."""
         if not self.current_geometry_state:
             return False, "No project loaded."
-        if group_type not in self.current_geometry_state.ui_groups:
+        ui_groups = self.current_geometry_state.ui_groups
+        if group_type not in ui_groups:
             return False, f"Invalid group type: {group_type}"
         
         # Check for name collision
-        if any(g['name'] == group_name for g in self.current_geometry_state.ui_groups[group_type]):
+        by_name = self._groups_by_name(group_type)
+        if group_name in by_name:
             return False, f"A group named '{group_name}' already exists for {group_type}."
             
-        self.current_geometry_state.ui_groups[group_type].append({
+        new_group = {
             "name": group_name,
-            "members": []
-        })
+            "members": {}
+        }
+        ui_groups[group_type].append(new_group)
+        by_name[group_name] = new_group
         
         # Capture the new state
         self._capture_history_state(f"Created {group_type} group {group_name}")
@@ -2548,17 +3063,19 @@ class ProjectManager:
         if group_type not in self.current_geometry_state.ui_groups:
             return False, f"Invalid group type: {group_type}"
         
-        groups = self.current_geometry_state.ui_groups[group_type]
+        by_name = self._groups_by_name(group_type)
         
         # Check if the new name is already taken (by a different group)
-        if any(g['name'] == new_name for g in groups if g['name'] != old_name):
+        if new_name != old_name and new_name in by_name:
             return False, f"A group named '{new_name}' already exists."
 
-        target_group = next((g for g in groups if g['name'] == old_name), None)
+        target_group = by_name.get(old_name)
         if not target_group:
             return False, f"Group '{old_name}' not found."
             
         target_group['name'] = new_name
+        del by_name[old_name]
+        by_name[new_name] = target_group
 
         # Capture the new state
         self._capture_history_state(f"Renamed {group_type} group {old_name} to {new_name}")
@@ -2569,16 +3086,17 @@ class ProjectManager:
         """Deletes a group. Its members become ungrouped."""
         if not self.current_geometry_state:
             return False, "No project loaded."
-        if group_type not in self.current_geometry_state.ui_groups:
+        ui_groups = self.current_geometry_state.ui_groups
+        if group_type not in ui_groups:
             return False, f"Invalid group type: {group_type}"
 
-        groups = self.current_geometry_state.ui_groups[group_type]
+        by_name = self._groups_by_name(group_type)
         
-        group_to_delete = next((g for g in groups if g['name'] == group_name), None)
+        group_to_delete = by_name.pop(group_name, None)
         if not group_to_delete:
             return False, f"Group '{group_name}' not found."
             
-        self.current_geometry_state.ui_groups[group_type] = [g for g in groups if g['name'] != group_name]
+        ui_groups[group_type].remove(group_to_delete)
 
         # Capture the new state
         self._capture_history_state(f"Deleted {group_type} group {group_name}")
@@ -2589,26 +3107,41 @@ class ProjectManager:
         """Moves a list of items to a target group, removing them from any previous group."""
         if not self.current_geometry_state:
             return False, "No project loaded."
-        if group_type not in self.current_geometry_state.ui_groups:
+        ui_groups = self.current_geometry_state.ui_groups
+        if group_type not in ui_groups:
             return False, f"Invalid group type: {group_type}"
 
-        groups = self.current_geometry_state.ui_groups[group_type]
+        groups = ui_groups[group_type]
         item_ids_set = set(item_ids)
 
-        # 1. Remove items from their old groups
-        for group in groups:
-            group['members'] = [member_id for member_id in group['members'] if member_id not in item_ids_set]
-
-        # 2. Add items to the new group (if a target group is specified)
+        # Resolve the target first so a bad name leaves every group untouched
+        target_group = None
         if target_group_name:
-            target_group = next((g for g in groups if g['name'] == target_group_name), None)
+            target_group = self._groups_by_name(group_type).get(target_group_name)
             if not target_group:
                 return False, f"Target group '{target_group_name}' not found."
-            
+
+        # 1. Remove items from their old groups (items already in the target stay where they are)
+        changed = False
+        for group in groups:
+            members = group['members']
+            if group is target_group or item_ids_set.isdisjoint(members):
+                continue
+            for item_id in item_ids_set:
+                members.pop(item_id, None)
+            changed = True
+
+        # 2. Add items to the new group (if a target group is specified)
+        if target_group is not None:
             # Add only items that aren't already there to prevent duplicates
+            members = target_group['members']
             for item_id in item_ids:
-                if item_id not in target_group['members']:
-                    target_group['members'].append(item_id)
+                if item_id not in members:
+                    members[item_id] = True
+                    changed = True
+
+        if not changed:
+            return True, None # Nothing moved: no history entry
         
         # Capture the new state
         self._capture_history_state(f"Moved items to {group_type} group {target_group_name}")
@@ -2620,8 +3153,9 @@ class ProjectManager:
         """Adds a new optical surface to the project."""
         if not self.current_geometry_state:
             return None, "No project loaded"
+        state = self.current_geometry_state
         
-        name = self._generate_unique_name(name_suggestion, self.current_geometry_state.optical_surfaces)
+        name = self._generate_unique_name(name_suggestion, state.optical_surfaces)
         
         new_surface = OpticalSurface(
             name=name,
@@ -2632,11 +3166,11 @@ class ProjectManager:
         )
         new_surface.properties = params.get('properties', {})
         
-        self.current_geometry_state.add_optical_surface(new_surface)
-        self.recalculate_geometry_state() # Recalculate if any values are expressions
+        state.add_optical_surface(new_surface)
+        self._recalculate_if_stale() # Surfaces are not evaluated by recalculation
 
         # Capture the new state
-        self._capture_history_state(f"Added optical surface {name}")
+        self._capture_history_state_keeping_evaluation(f"Added optical surface {name}")
         
         return new_surface.to_dict(), None
 
@@ -2650,16 +3184,21 @@ class ProjectManager:
             return False, f"Optical Surface '{surface_name}' not found."
 
         # Update attributes from the params dictionary
-        target_surface.model = new_params.get('model', target_surface.model)
-        target_surface.finish = new_params.get('finish', target_surface.finish)
-        target_surface.type = new_params.get('surf_type', target_surface.type)
-        target_surface.value = new_params.get('value', target_surface.value)
-        target_surface.properties = new_params.get('properties', target_surface.properties)
-
-        self.recalculate_geometry_state()
+        new_values = (new_params.get('model', target_surface.model),
+                      new_params.get('finish', target_surface.finish),
+                      new_params.get('surf_type', target_surface.type),
+                      new_params.get('value', target_surface.value),
+                      new_params.get('properties', target_surface.properties))
+        if new_values == (target_surface.model, target_surface.finish, target_surface.type,
+                          target_surface.value, target_surface.properties):
+            return True, None # Nothing changed: no history entry
+        (target_surface.model, target_surface.finish, target_surface.type,
+         target_surface.value, target_surface.properties) = new_values
+
+        self._recalculate_if_stale() # Surfaces are not evaluated by recalculation
 
         # Capture the new state
-        self._capture_history_state(f"Updated optical surface {surface_name}")
+        self._capture_history_state_keeping_evaluation(f"Updated optical surface {surface_name}")
 
         return True, None
 
@@ -2685,11 +3224,10 @@ class ProjectManager:
         )
         
         state.add_skin_surface(new_skin_surface)
-        # No recalculation is needed as this is just a link, but we'll do it for consistency.
-        self.recalculate_geometry_state()
+        self._recalculate_if_stale() # Surfaces are not evaluated by recalculation
 
         # Capture the new state
-        self._capture_history_state(f"Added skin surface {name}")
+        self._capture_history_state_keeping_evaluation(f"Added skin surface {name}")
         
         return new_skin_surface.to_dict(), None
 
@@ -2713,28 +3251,41 @@ class ProjectManager:
         target_surface.volume_ref = new_volume_ref
         target_surface.surfaceproperty_ref = new_surface_ref
 
-        self.recalculate_geometry_state()
+        self._recalculate_if_stale() # Surfaces are not evaluated by recalculation
 
         # Capture the new state
-        self._capture_history_state(f"Updated skin surface {surface_name}")
+        self._capture_history_state_keeping_evaluation(f"Updated skin surface {surface_name}")
 
         return True, None
 
     def _find_pv_by_id(self, pv_id):
         """Helper to find a PV object by its UUID across the entire geometry."""
+        return self._find_pv_container(pv_id)[1]
+
+    def _find_pv_container(self, pv_id):
+        """Returns (LV or Assembly holding the PV, PV) for a PV UUID, or (None, None)."""
+        index = self._pv_index
+        if index is None or self._pv_index_state is not self.current_geometry_state or pv_id not in index:
+            # Rebuilt on a miss too, so placements appended without a history capture are found
+            index = self._build_pv_index()
+        return index.get(pv_id, (None, None))
+
+    def _build_pv_index(self):
+        """Indexes every placement in logical volumes and assemblies by its ID."""
         state = self.current_geometry_state
+        index = {}
         # Search in Logical Volumes
         for lv in state.logical_volumes.values():
             if lv.content_type == 'physvol':
                 for pv in lv.content:
-                    if pv.id == pv_id:
-                        return pv
+                    index.setdefault(pv.id, (lv, pv))
         # Search in Assemblies
         for asm in state.assemblies.values():
             for pv in asm.placements:
-                if pv.id == pv_id:
-                    return pv
-        return None
+                index.setdefault(pv.id, (asm, pv))
+        self._pv_index = index
+        self._pv_index_state = state
+        return index
 
     def add_border_surface(self, name_suggestion, pv1_ref_id, pv2_ref_id, surface_ref):
         """Adds a new border surface link to the project."""
@@ -2761,10 +3312,10 @@ class ProjectManager:
         )
         
         state.add_border_surface(new_border_surface)
-        self.recalculate_geometry_state()
+        self._recalculate_if_stale() # Surfaces are not evaluated by recalculation
 
         # Capture the new state
-        self._capture_history_state(f"Added border surface {name}")
+        self._capture_history_state_keeping_evaluation(f"Added border surface {name}")
         
         return new_border_surface.to_dict(), None
 
@@ -2791,10 +3342,10 @@ class ProjectManager:
         target_surface.physvol2_ref = new_pv2_ref_id
         target_surface.surfaceproperty_ref = new_surface_ref
 
-        self.recalculate_geometry_state()
+        self._recalculate_if_stale() # Surfaces are not evaluated by recalculation
 
         # Capture the new state
-        self._capture_history_state(f"Updated border surface {surface_name}")
+        self._capture_history_state_keeping_evaluation(f"Updated border surface {surface_name}")
 
         return True, None
 
@@ -2802,8 +3353,9 @@ class ProjectManager:
         """Adds a new particle source to the project, optionally linked to a volume."""
         if not self.current_geometry_state:
             return None, "No project loaded"
+        state = self.current_geometry_state
 
-        name = self._generate_unique_name(name_suggestion, self.current_geometry_state.sources)
+        name = self._generate_unique_name(name_suggestion, state.sources)
         
         # If Linked, calculate global transform
         if volume_link_id:
@@ -2822,9 +3374,9 @@ class ProjectManager:
                     confine_to_pv = pv.name
                 
                 # Fetch shape info from the linked Logical Volume -> Solid
-                lv = self.current_geometry_state.logical_volumes.get(pv.volume_ref)
+                lv = state.logical_volumes.get(pv.volume_ref)
                 if lv:
-                    solid = self.current_geometry_state.solids.get(lv.solid_ref)
+                    solid = state.solids.get(lv.solid_ref)
                     if solid:
                         p = solid._evaluated_parameters
                         
@@ -2864,11 +3416,11 @@ class ProjectManager:
             volume_link_id=volume_link_id
         )
 
-        self.current_geometry_state.add_source(new_source)
+        state.add_source(new_source)
         
         # Auto-activate new manually created sources
-        if new_source.id not in self.current_geometry_state.active_source_ids:
-            self.current_geometry_state.active_source_ids.append(new_source.id)
+        if new_source.id not in state.active_source_ids:
+            state.active_source_ids.append(new_source.id)
             
         self.recalculate_geometry_state()
         self._capture_history_state(f"Added particle source {name}")
@@ -2879,9 +3431,10 @@ class ProjectManager:
         """Updates the properties of an existing particle source."""
         if not self.current_geometry_state:
             return False, "No project loaded"
+        state = self.current_geometry_state
 
         source_to_update = None
-        for source in self.current_geometry_state.sources.values():
+        for source in state.sources.values():
             if source.id == source_id:
                 source_to_update = source
                 break
@@ -2891,12 +3444,12 @@ class ProjectManager:
 
         # Check for name change and ensure uniqueness if it changed
         if new_name and new_name != source_to_update.name:
-            if new_name in self.current_geometry_state.sources:
+            if new_name in state.sources:
                 return False, f"A source named '{new_name}' already exists."
             # To rename, we remove the old entry and add a new one
-            del self.current_geometry_state.sources[source_to_update.name]
+            del state.sources[source_to_update.name]
             source_to_update.name = new_name
-            self.current_geometry_state.sources[new_name] = source_to_update
+            state.sources[new_name] = source_to_update
 
         if new_gps_commands is not None:
             source_to_update.gps_commands = new_gps_commands
@@ -2941,9 +3494,9 @@ class ProjectManager:
 
                 # 2. Update Shape Parameters to match the Volume dimensions
                 # Fetch shape info from the linked Logical Volume -> Solid
-                lv = self.current_geometry_state.logical_volumes.get(pv.volume_ref)
+                lv = state.logical_volumes.get(pv.volume_ref)
                 if lv:
-                    solid = self.current_geometry_state.solids.get(lv.solid_ref)
+                    solid = state.solids.get(lv.solid_ref)
                     if solid:
                         p = solid._evaluated_parameters
                         cmds = source_to_update.gps_commands
@@ -2988,27 +3541,30 @@ class ProjectManager:
         """Sets or toggles the active source for the simulation."""
         if not self.current_geometry_state:
             return False, "No project loaded"
+        state = self.current_geometry_state
 
         # If source_id is None, clear all active sources
         if source_id is None:
-            self.current_geometry_state.active_source_ids = []
+            state.active_source_ids = []
             self.is_changed = True
+            self._saved_json = None
             return True, "All sources deactivated."
 
         # Verify the source ID exists
-        found = any(s.id == source_id for s in self.current_geometry_state.sources.values())
+        found = any(s.id == source_id for s in state.sources.values())
         if not found:
             return False, f"Source with ID {source_id} not found."
 
         # Toggle logic: if present, remove it; if absent, add it.
-        if source_id in self.current_geometry_state.active_source_ids:
-            self.current_geometry_state.active_source_ids.remove(source_id)
+        if source_id in state.active_source_ids:
+            state.active_source_ids.remove(source_id)
             msg = "Source deactivated."
         else:
-            self.current_geometry_state.active_source_ids.append(source_id)
+            state.active_source_ids.append(source_id)
             msg = "Source activated."
 
         self.is_changed = True
+        self._saved_json = None
         return True, msg
 
     def _find_pv_by_name(self, pv_name):
@@ -3084,8 +3640,12 @@ class ProjectManager:
             
             if parent_placement:
                 # Apply parent transform: Global = Parent * Child
-                parent_matrix = parent_placement.get_transform_matrix()
-                current_transform = parent_matrix @ current_transform
+                # (an identity placement, e.g. a part imported at the origin, leaves it unchanged)
+                if not (parent_placement._evaluated_position == _ZERO_VEC and
+                        parent_placement._evaluated_rotation == _ZERO_VEC and
+                        parent_placement._evaluated_scale == _UNIT_VEC):
+                    parent_matrix = parent_placement.get_transform_matrix()
+                    current_transform = parent_matrix @ current_transform
                 
                 # Move up one level
                 current_parent_lv_name = parent_placement.parent_lv_name
@@ -0,0 +1,27 @@
+import math
+
+from src.expression_evaluator import ExpressionEvaluator
+
+
+def _evaluate_twice(expression, name, first, second):
+    evaluator = ExpressionEvaluator()
+    evaluator.add_symbol(name, first)
+    evaluator.evaluate(expression) # Parse on first sight
+    ok, first_result = evaluator.evaluate(expression) # Goes through the value memo
+    assert ok
+    evaluator.add_symbol(name, second)
+    ok, second_result = evaluator.evaluate(expression)
+    assert ok
+    return first_result, second_result
+
+
+def test_memo_distinguishes_int_and_float_inputs():
+    first, second = _evaluate_twice("a*2", "a", 3, 3.0)
+    assert first == 6 and type(first) is int
+    assert second == 6.0 and type(second) is float
+
+
+def test_memo_distinguishes_signed_zero_inputs():
+    first, second = _evaluate_twice("atan2(x, -1)", "x", 0.0, -0.0)
+    assert first == math.pi
+    assert second == -math.pi
@@ -0,0 +1,172 @@
+"""
+Each incremental recalculation path must leave the project exactly as a full
+recalculate_geometry_state() would.
+"""
+import json
+
+from src.expression_evaluator import ExpressionEvaluator
+from src.geometry_types import GeometryState
+from src.project_manager import ProjectManager
+
+ZERO = {'x': '0', 'y': '0', 'z': '0'}
+ONE = {'x': '1', 'y': '1', 'z': '1'}
+
+
+def _build_project():
+    pm = ProjectManager(ExpressionEvaluator())
+    pm.create_empty_project()
+    pm.add_define('A', 'constant', '5')
+    pm.add_define('B', 'constant', 'A*2') # Read only by other defines
+    pm.add_define('C', 'constant', 'B+1')
+    pm.add_define('L', 'constant', '2*10') # Read by solids and placements
+    pm.add_define('Q', 'constant', '4')    # Not read by anything yet
+    pm.add_define('pos1', 'position', {'x': 'L', 'y': '0', 'z': '1'}, 'mm')
+    pm.add_define('rot1', 'rotation', {'x': '0', 'y': '90', 'z': '0'}, 'deg')
+    pm.add_solid('t', 'tube', {'rmax': 'L', 'z': '50', 'lunit': 'mm', 'deltaphi': '360', 'aunit': 'deg'})
+    pm.add_solid('tr', 'trd', {'x1': '10', 'x2': '20', 'y1': 'L', 'y2': '4', 'z': '8'})
+    pm.add_boolean_solid('b', [{'op': 'base', 'solid_ref': 't'},
+                               {'op': 'union', 'solid_ref': 'tr',
+                                'transform': {'position': {'x': 'L', 'y': '0', 'z': '0'}, 'rotation': 'rot1'}}])
+    pm.add_logical_volume('t_lv', 't', 'G4_Galactic')
+    pm.add_physical_volume('World', 't_pv', 't_lv', 'pos1', 'rot1', ONE)
+    pm.add_physical_volume('World', 't_pv2', 't_lv', {'x': 'L', 'y': '0', 'z': '0'}, {'x': '0', 'y': '0', 'z': '45*deg'}, ONE)
+    pm.add_assembly('asm', [{'name': 'a1', 'volume_ref': 't_lv', 'position': {'x': '1', 'y': '2', 'z': '3'},
+                             'rotation': {'x': '0', 'y': '0', 'z': '0.1'}}])
+    success, error_msg = pm.recalculate_geometry_state()
+    assert success, error_msg
+    return pm
+
+
+def _evaluated(pm):
+    """The full serialized project, including every evaluated value."""
+    return json.loads(pm.save_project_to_json_string())
+
+
+def _assert_matches_full_recalculation(pm):
+    incremental = _evaluated(pm)
+    success, error_msg = pm.recalculate_geometry_state()
+    assert success, error_msg
+    assert incremental == _evaluated(pm)
+
+
+def _count_full_recalculations(pm):
+    calls = []
+    full = pm.recalculate_geometry_state
+    pm.recalculate_geometry_state = lambda: calls.append(1) or full()
+    return calls
+
+
+def _placement(pm, name):
+    state = pm.current_geometry_state
+    for lv in state.logical_volumes.values():
+        if lv.content_type == 'physvol':
+            for pv in lv.content:
+                if pv.name == name:
+                    return pv
+    for asm in state.assemblies.values():
+        for pv in asm.placements:
+            if pv.name == name:
+                return pv
+    raise KeyError(name)
+
+
+def test_define_only_chain_is_recalculated_incrementally():
+    pm = _build_project()
+    calls = _count_full_recalculations(pm)
+    for name, expression in [('A', '7'), ('B', 'A*A'), ('C', 'B*2')]:
+        success, error_msg = pm.update_define(name, expression)
+        assert success, error_msg
+    assert not calls
+    del pm.recalculate_geometry_state
+    _assert_matches_full_recalculation(pm)
+
+
+def test_define_read_by_solids_and_placements():
+    pm = _build_project()
+    success, error_msg = pm.update_define('L', '4')
+    assert success, error_msg
+    _assert_matches_full_recalculation(pm)
+
+
+def test_placement_edits_are_recalculated_incrementally():
+    pm = _build_project()
+    calls = _count_full_recalculations(pm)
+    edits = [(_placement(pm, 't_pv').id, 'moved', {'x': 'C', 'y': 'L/2', 'z': '3'}, {'x': '10*deg', 'y': '0', 'z': '0'}, None),
+             (_placement(pm, 'a1').id, None, None, {'x': '0.3', 'y': '0', 'z': '0'}, {'x': '2', 'y': '1', 'z': '1'}),
+             (_placement(pm, 't_pv2').id, None, 'pos1', 'rot1', None)]
+    for edit in edits:
+        success, error_msg = pm.update_physical_volume(*edit)
+        assert success, error_msg
+    assert not calls
+    del pm.recalculate_geometry_state
+    _assert_matches_full_recalculation(pm)
+
+
+def test_define_newly_read_by_an_edited_placement():
+    pm = _build_project()
+    success, error_msg = pm.update_physical_volume(_placement(pm, 't_pv').id, None, {'x': 'Q*3', 'y': '0', 'z': '0'}, None, None)
+    assert success, error_msg
+    # Q was not read by anything at the last full recalculation
+    success, error_msg = pm.update_define('Q', '5')
+    assert success, error_msg
+    assert _placement(pm, 't_pv')._evaluated_position['x'] == 15
+    _assert_matches_full_recalculation(pm)
+
+
+def test_solid_edits_are_recalculated_incrementally():
+    pm = _build_project()
+    calls = _count_full_recalculations(pm)
+    success, error_msg = pm.update_solid('t', {'rmax': 'Q*2', 'z': '50', 'lunit': 'cm', 'deltaphi': '180', 'aunit': 'deg'})
+    assert success, error_msg
+    success, error_msg = pm.update_boolean_solid('b', [{'op': 'base', 'solid_ref': 't'},
+                                                       {'op': 'subtraction', 'solid_ref': 'tr',
+                                                        'transform': {'position': {'x': 'Q', 'y': '0', 'z': '1'},
+                                                                      'rotation': {'x': '0', 'y': 'A', 'z': '0'}}}])
+    assert success, error_msg
+    assert not calls
+    del pm.recalculate_geometry_state
+    _assert_matches_full_recalculation(pm)
+
+    # Both solids now read Q and A, so editing them must reach the solids
+    success, error_msg = pm.update_define('Q', '6')
+    assert success, error_msg
+    _assert_matches_full_recalculation(pm)
+
+
+def test_stale_evaluation_falls_back_to_full_recalculation():
+    pm = _build_project()
+    # A state the evaluator's symbol table was never built from
+    pm.current_geometry_state = GeometryState.from_dict(pm.current_geometry_state.to_dict())
+    state = pm.current_geometry_state
+    state.defines['L'].raw_expression = '3'
+    state.solids['t'].raw_parameters['rmax'] = 'L*2'
+    _placement(pm, 't_pv2').position = {'x': 'L', 'y': 'L', 'z': '0'}
+
+    assert pm.recalculate_solids([state.solids['t']])[0]
+    assert pm.current_geometry_state.solids['t']._evaluated_parameters['rmax'] == 6
+    _assert_matches_full_recalculation(pm)
+
+    pm._evaluated_state = None
+    assert pm.recalculate_placements([_placement(pm, 't_pv2')])[0]
+    _assert_matches_full_recalculation(pm)
+
+    pm._evaluated_state = None
+    assert pm.recalculate_dependents_of('L')[0]
+    _assert_matches_full_recalculation(pm)
+
+
+def test_merge_with_renames_matches_full_recalculation():
+    pm = _build_project()
+    incoming = GeometryState.from_dict({
+        'defines': {'L': {'name': 'L', 'type': 'constant', 'raw_expression': '7'}, # Clashes: renamed to L_1
+                    'w_key': {'name': 'WName', 'type': 'constant', 'raw_expression': 'L*2'}},
+        'solids': {'t': {'name': 't', 'type': 'box', 'raw_parameters': {'x': 'w_key', 'y': 'L', 'z': '1'}}},
+        'logical_volumes': {'lv_key': {'name': 'LvName', 'solid_ref': 't', 'material_ref': 'G4_Galactic'}},
+    })
+    success, error_msg = pm.merge_from_state(incoming)
+    assert success, error_msg
+
+    state = pm.current_geometry_state
+    assert state.defines['w_key'].name == 'w_key'
+    assert state.logical_volumes['lv_key'].solid_ref == 't_1'
+    _assert_matches_full_recalculation(pm)
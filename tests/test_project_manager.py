@@ -0,0 +1,134 @@
+from src.expression_evaluator import ExpressionEvaluator
+from src.project_manager import ProjectManager
+
+
+def _new_project():
+    pm = ProjectManager(ExpressionEvaluator())
+    pm.create_empty_project()
+    return pm
+
+
+def _ai_response(**extra):
+    placement = {'name': 'ai_box_PV', 'volume_ref': 'ai_box_LV',
+                 'position': {'x': '0', 'y': '0', 'z': '0'},
+                 'rotation': {'x': '0', 'y': '0', 'z': '0'}}
+    response = {
+        'creates': {
+            'defines': {'ai_len': {'name': 'ai_len', 'type': 'constant', 'raw_expression': '10'}},
+            'solids': {'ai_box': {'name': 'ai_box', 'type': 'box',
+                                  'raw_parameters': {'x': 'ai_len', 'y': 'ai_len', 'z': 'ai_len'}}},
+            'logical_volumes': {'ai_box_LV': {'name': 'ai_box_LV', 'solid_ref': 'ai_box',
+                                              'material_ref': 'G4_AIR'}},
+        },
+        # The parent is one of the LVs created above
+        'updates': [{'object_type': 'logical_volume', 'object_name': 'ai_box_LV',
+                     'action': 'append_physvol', 'data': dict(placement, name='inner_PV')},
+                    {'object_type': 'logical_volume', 'object_name': 'World',
+                     'action': 'append_physvol', 'data': placement}],
+    }
+    response.update(extra)
+    return response
+
+
+def _assert_rejected_without_changes(pm, response, expected_error):
+    before = pm.save_project_to_json_string()
+    history_len, history_index = len(pm.history), pm.history_index
+
+    success, error_msg = pm.process_ai_response(response)
+
+    assert not success
+    assert expected_error in error_msg
+    assert pm.save_project_to_json_string() == before
+    assert (len(pm.history), pm.history_index) == (history_len, history_index)
+
+
+def test_ai_response_places_into_created_volumes():
+    pm = _new_project()
+    success, error_msg = pm.process_ai_response(_ai_response())
+    assert success, error_msg
+    assert [pv.name for pv in pm.current_geometry_state.logical_volumes['ai_box_LV'].content] == ['inner_PV']
+
+
+def test_ai_response_with_missing_parent_is_rejected_before_merging():
+    pm = _new_project()
+    response = _ai_response()
+    response['updates'][1]['object_name'] = 'missing_LV'
+    _assert_rejected_without_changes(pm, response, 'missing_LV')
+
+
+def test_ai_response_failing_after_merge_leaves_project_unchanged():
+    pm = _new_project()
+    # The creates and placements are applied before this tool call fails
+    response = _ai_response(tool_calls=[{'tool_name': 'create_detector_ring', 'arguments': {'no_such_argument': 1}}])
+    _assert_rejected_without_changes(pm, response, 'Mismatched arguments')
+
+
+def test_deleted_name_is_reused():
+    pm = _new_project()
+    params = {'x': '10', 'y': '10', 'z': '10'}
+    names = [pm.add_solid('Box', 'box', params)[0]['name'] for _ in range(3)]
+    assert names == ['Box', 'Box_1', 'Box_2']
+
+    success, error_msg = pm.delete_objects_batch([{'type': 'solid', 'id': 'Box_1'}])
+    assert success, error_msg
+    assert pm.add_solid('Box', 'box', params)[0]['name'] == 'Box_1'
+    assert pm.add_solid('Box', 'box', params)[0]['name'] == 'Box_3'
+
+
+def _add_source(pm, name):
+    source, error_msg = pm.add_particle_source(name, {}, {'x': '0', 'y': '0', 'z': '0'},
+                                               {'x': '0', 'y': '0', 'z': '0'})
+    assert error_msg is None
+    return source
+
+
+def test_source_name_freed_by_delete_is_reused():
+    pm = _new_project()
+    sources = [_add_source(pm, 'S') for _ in range(3)]
+    assert [s['name'] for s in sources] == ['S', 'S_1', 'S_2']
+
+    # Sources are deleted by ID, not by name
+    success, error_msg = pm.delete_objects_batch([{'type': 'particle_source', 'id': sources[1]['id']}])
+    assert success, error_msg
+    assert _add_source(pm, 'S')['name'] == 'S_1'
+
+
+def test_source_name_freed_by_rename_is_reused():
+    pm = _new_project()
+    sources = [_add_source(pm, 'S') for _ in range(3)]
+
+    success, error_msg = pm.update_particle_source(sources[2]['id'], 'other', None, None, None)
+    assert success, error_msg
+    assert _add_source(pm, 'S')['name'] == 'S_2'
+
+
+def _keyed_incoming_state():
+    # Objects keyed by one name and carrying another, as AI responses can produce
+    from src.geometry_types import GeometryState
+    return GeometryState.from_dict({
+        'defines': {'len_key': {'name': 'LenName', 'type': 'constant', 'raw_expression': '10'}},
+        'solids': {'box_key': {'name': 'BoxName', 'type': 'box',
+                               'raw_parameters': {'x': 'len_key', 'y': '1', 'z': '1'}}},
+        'logical_volumes': {'lv_key': {'name': 'LvName', 'solid_ref': 'box_key',
+                                       'material_ref': 'G4_Galactic'}},
+    })
+
+
+def _assert_names_match_keys(state):
+    for collection in (state.defines, state.materials, state.solids, state.logical_volumes, state.assemblies):
+        for key, obj in collection.items():
+            assert obj.name == key
+
+
+def test_merge_uses_incoming_keys_as_names():
+    pm = _new_project()
+    success, error_msg = pm.merge_from_state(_keyed_incoming_state()) # No clashes: bulk path
+    assert success, error_msg
+    success, error_msg = pm.merge_from_state(_keyed_incoming_state()) # Clashes: renaming path
+    assert success, error_msg
+
+    state = pm.current_geometry_state
+    _assert_names_match_keys(state)
+    assert state.solids['box_key']._evaluated_parameters['x'] == 10
+    assert state.logical_volumes['lv_key'].solid_ref == 'box_key'
+    assert state.logical_volumes['lv_key_1'].solid_ref == 'box_key_1'
@@ -0,0 +1,73 @@
+import io
+import sys
+import types
+
+import pytest
+
+import src.project_manager as project_manager
+from src.expression_evaluator import ExpressionEvaluator
+from src.geometry_types import GeometryState, LogicalVolume, PhysicalVolumePlacement, Solid
+
+
+@pytest.fixture
+def parsed_files(monkeypatch):
+    """Replaces the STEP parser (which needs pythonocc) and records every file it reads."""
+    parsed = []
+
+    def parse_step_file(path, options):
+        with open(path, 'rb') as f:
+            parsed.append(f.read())
+        state = GeometryState()
+        state.add_solid(Solid('part', 'box', {'x': '1', 'y': '1', 'z': '1'}))
+        state.add_logical_volume(LogicalVolume('part_lv', 'part', 'G4_Galactic'))
+        state.placements_to_add = [PhysicalVolumePlacement('part_pv', 'part_lv', parent_lv_name='World')]
+        state.grouping_name = options['groupingName']
+        return state
+
+    step_parser = types.ModuleType('src.step_parser')
+    step_parser.parse_step_file = parse_step_file
+    monkeypatch.setitem(sys.modules, 'src.step_parser', step_parser)
+    return parsed
+
+
+def _new_project():
+    pm = project_manager.ProjectManager(ExpressionEvaluator())
+    pm.create_empty_project()
+    return pm
+
+
+def _import(pm, data, grouping_name='part'):
+    success, error_msg = pm.import_step_with_options(io.BytesIO(data), {'groupingName': grouping_name})
+    assert success, error_msg
+
+
+def test_reimport_is_served_from_cache(parsed_files):
+    pm = _new_project()
+    _import(pm, b'step file')
+    _import(pm, b'step file')
+    assert parsed_files == [b'step file']
+
+    # The cached copy is merged as new objects with their own names and IDs
+    state = pm.current_geometry_state
+    assert {'part', 'part_1'} <= set(state.solids)
+    placements = state.logical_volumes['World'].content
+    assert len({pv.id for pv in placements}) == len(placements)
+
+
+def test_changed_options_miss_the_cache(parsed_files):
+    pm = _new_project()
+    _import(pm, b'step file', 'first')
+    _import(pm, b'step file', 'second')
+    assert len(parsed_files) == 2
+
+
+def test_least_recently_used_file_is_evicted(parsed_files, monkeypatch):
+    monkeypatch.setattr(project_manager, 'STEP_CACHE_SIZE', 2)
+    pm = _new_project()
+    _import(pm, b'a')
+    _import(pm, b'b')
+    _import(pm, b'a') # Hit: 'a' becomes the most recently used
+    _import(pm, b'c') # Evicts 'b'
+    _import(pm, b'a')
+    _import(pm, b'b')
+    assert parsed_files == [b'a', b'b', b'c', b'b']